@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), 'src'))
+
+from waybill_generator import generate_waybills
+from main import parse_roi
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of this process in MB, or None where unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_case(pdf_path, output_path, jobs, roi, stamp_mode, save_profile, pipeline=False):
+    """
+    Extracts and stamps one PDF in this process and measures both stages (or, with
+    pipeline, the combined extract_and_stamp_pdf run). Runs in its own process (see
+    measure_case), so the peak RSS belongs to this case only.
+    """
+    from main import extract_and_stamp_pdf, extract_document, stamp_skus_on_pdf
+    from run_report import RunReport
+    import fitz # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count
+
+    report = RunReport()
+    if pipeline:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            extraction, stamped = extract_and_stamp_pdf(pdf_path, output_path, workers=jobs, roi=roi, report=report,
+                                                        mode=stamp_mode, save_profile=save_profile)
+            total_seconds = time.perf_counter() - start
+        if extraction is None:
+            raise RuntimeError(f"Extraction of '{pdf_path}' failed")
+        return case_result(pdf_path, output_path, pages, extraction, stamped, report, None, None, total_seconds, None)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        extraction = extract_document(pdf_path, workers=jobs, roi=roi)
+        extract_seconds = time.perf_counter() - start
+        if extraction is None:
+            raise RuntimeError(f"Extraction of '{pdf_path}' failed")
+        sku_locations = extraction.sku_locations
+        extract_peak_rss_mb = peak_rss_mb()
+
+        start = time.perf_counter()
+        stamped = bool(sku_locations) and stamp_skus_on_pdf(pdf_path, sku_locations, output_path, {},
+                                                           mode=stamp_mode, pages=extraction.pages,
+                                                           save_profile=save_profile, report=report)
+        stamp_seconds = time.perf_counter() - start
+
+    return case_result(pdf_path, output_path, pages, extraction, stamped, report, extract_seconds, stamp_seconds,
+                       extract_seconds + stamp_seconds, extract_peak_rss_mb)
+
+def case_result(pdf_path, output_path, pages, extraction, stamped, report, extract_seconds, stamp_seconds,
+                total_seconds, extract_peak_rss_mb):
+    return {
+        'pages': pages,
+        'skus': len(extraction.sku_locations) if extraction else 0,
+        'extract_seconds': extract_seconds,
+        'extract_pages_per_sec': pages / extract_seconds if extract_seconds else None,
+        'extract_peak_rss_mb': extract_peak_rss_mb,
+        'stamp_seconds': stamp_seconds,
+        'stamp_pages_per_sec': pages / stamp_seconds if stamped and stamp_seconds else None,
+        'total_seconds': total_seconds,
+        'save_seconds': report.stages['save']['wall_seconds'] if 'save' in report.stages else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'input_bytes': os.path.getsize(pdf_path),
+        'output_bytes': os.path.getsize(output_path) if stamped else None
+    }
+
+def format_roi(roi):
+    """
+    Returns a parsed --roi value as the option text, e.g. "auto" or "0,0,298,300".
+    """
+    if roi is None or isinstance(roi, str):
+        return roi
+    return ",".join(format(value, 'g') for value in roi)
+
+def measure_case(pdf_path, output_path, jobs, roi, stamp_mode, save_profile, pipeline=False):
+    """
+    Runs run_case() in a fresh Python process and returns its measurements.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", pdf_path, output_path, "--jobs", str(jobs),
+               "--stamp-mode", stamp_mode, "--save-profile", save_profile]
+    if roi:
+        command += ["--roi", format_roi(roi)]
+    if pipeline:
+        command.append("--pipeline")
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark of '{pdf_path}' failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def format_optional(value, fmt):
+    return "-" if value is None else format(value, fmt)
+
+def print_results(results):
+    print(f"\n{'pages':>6} {'skus':>7} {'extract s':>10} {'pages/s':>9} {'stamp s':>9} {'pages/s':>9} "
+          f"{'total s':>8} {'save s':>7} {'peak MB':>8} {'in KB':>8} {'out KB':>8}")
+    for result in results:
+        output_kb = result['output_bytes'] / 1024 if result['output_bytes'] is not None else None
+        print(f"{result['pages']:>6} {result['skus']:>7} {format_optional(result['extract_seconds'], '.2f'):>10} "
+              f"{format_optional(result['extract_pages_per_sec'], '.1f'):>9} "
+              f"{format_optional(result['stamp_seconds'], '.2f'):>9} "
+              f"{format_optional(result['stamp_pages_per_sec'], '.1f'):>9} {result['total_seconds']:>8.2f} "
+              f"{format_optional(result['save_seconds'], '.2f'):>7} "
+              f"{format_optional(result['peak_rss_mb'], '.1f'):>8} {result['input_bytes'] / 1024:>8.1f} "
+              f"{format_optional(output_kb, '.1f'):>8}")
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SKU extraction and stamping on synthetic waybills.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f"Page counts to benchmark (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--skus-per-order", type=int, default=2, help="Maximum product lines per order (default: 2)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated waybills (default: 1)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Extraction worker processes (default: 1)")
+    parser.add_argument("--roi", type=parse_roi,
+                        help="Region of interest passed to the extraction: 'auto' or X0,Y0,X1,Y1 in points")
+    parser.add_argument("--stamp-mode", choices=["in-place", "copy"], default="in-place",
+                        help="Stamping mode passed to stamp_skus_on_pdf (default: in-place)")
+    parser.add_argument("--save-profile", choices=["fast", "balanced", "smallest"], default="balanced",
+                        help="Save profile passed to stamp_skus_on_pdf (default: balanced)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Stamp while extracting (extract_and_stamp_pdf); only total times are reported")
+    parser.add_argument("--fixtures-dir", help="Keep generated PDFs here and reuse them on later runs")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    parser.add_argument("--run-case", nargs=2, metavar=("PDF", "OUTPUT"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_arguments()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case[0], args.run_case[1], args.jobs, args.roi, args.stamp_mode,
+                                  args.save_profile, args.pipeline)))
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixtures_dir = args.fixtures_dir or work_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+        results = []
+        for pages in args.sizes:
+            pdf_path = os.path.join(fixtures_dir, f"waybills_{pages}p_{args.skus_per_order}s_seed{args.seed}.pdf")
+            if not os.path.exists(pdf_path):
+                print(f"Generating {pages}-page waybill PDF...")
+                generate_waybills(pdf_path, pages=pages, skus_per_order=args.skus_per_order, seed=args.seed)
+
+            print(f"Benchmarking {pages} page(s)...")
+            result = measure_case(pdf_path, os.path.join(work_dir, f"stamped_{pages}p.pdf"), args.jobs, args.roi,
+                                  args.stamp_mode, args.save_profile, args.pipeline)
+            result['jobs'] = args.jobs
+            result['roi'] = format_roi(args.roi)
+            result['stamp_mode'] = args.stamp_mode
+            result['save_profile'] = args.save_profile
+            result['pipeline'] = args.pipeline
+            results.append(result)
+
+    print_results(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to '{args.json_path}'.")
+
+if __name__ == "__main__":
+    main()
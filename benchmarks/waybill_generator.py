@@ -0,0 +1,139 @@
+import argparse
+import random
+import fitz # PyMuPDF
+
+# TikTok waybills are printed on A6 label stock
+PAGE_WIDTH = 298
+PAGE_HEIGHT = 420
+
+# SKU codes as they appear in the waybill SKU column; the rules in main.py strip the
+# prefix, apply aliases and multiply by trailing numbers
+PLAIN_SKUS = ["C_BWL", "C_BWM", "C_CBV", "C_WASH-L", "C_WASH-M", "C_TOWEL_3", "C_SPF50-1",
+              "C_9oz2", "C_BABY WASH LAVENDER", "C_LOTION-2", "C_DIAPER_CREAM"]
+SPLIT_SKUS = ["C_BWM/BWL", "C_9oz2+6m", "C_BWL/CBV/BWM", "C_WASH-L+WASH-M"]
+B1T1_SKUS = ["C_B1T1-CBV", "C_B1T1_BWM", "C_B1T1_TOWEL"]
+
+def random_sku(rnd, split_ratio, b1t1_ratio, multiplier_ratio):
+    """
+    Picks the SKU text for one product line.
+
+    Returns:
+        tuple: (SKU text, 'xN' text to print beside the SKU or None)
+    """
+    roll = rnd.random()
+    if roll < split_ratio:
+        sku = rnd.choice(SPLIT_SKUS)
+    elif roll < split_ratio + b1t1_ratio:
+        sku = rnd.choice(B1T1_SKUS)
+    else:
+        sku = rnd.choice(PLAIN_SKUS)
+
+    multiplier = None
+    if rnd.random() < multiplier_ratio:
+        multiplier = f"x{rnd.randint(2, 5)}"
+        # Half of the multipliers are part of the SKU text, the rest a separate word
+        if rnd.random() < 0.5:
+            sku, multiplier = f"{sku} {multiplier}", None
+    return sku, multiplier
+
+def add_product_lines(page, rnd, y, count, options):
+    for _ in range(count):
+        sku, multiplier = random_sku(rnd, options['split_ratio'], options['b1t1_ratio'], options['multiplier_ratio'])
+        page.insert_text((20, y), "Baby care item", fontsize=7)
+        page.insert_text((90, y), sku, fontsize=7)
+        if multiplier:
+            page.insert_text((190, y), multiplier, fontsize=7)
+        page.insert_text((250, y), str(rnd.randint(1, 3)), fontsize=7)
+        y += 14
+    return y
+
+def add_waybill_header(page, rnd, order_id):
+    page.insert_text((20, 25), "TikTok Shop", fontsize=10)
+    page.insert_text((180, 25), f"Tracking: PH{rnd.randint(10 ** 11, 10 ** 12 - 1)}", fontsize=7)
+    page.draw_rect(fitz.Rect(20, 35, 278, 95), color=(0, 0, 0), width=0.5)
+    page.insert_text((25, 50), "Ship To: Juan Dela Cruz", fontsize=7)
+    page.insert_text((25, 62), f"{rnd.randint(1, 999)} Rizal Street, Barangay {rnd.randint(1, 99)}, Manila", fontsize=7)
+    page.insert_text((25, 80), "From: Cheeky Concepts Warehouse, Pasig City", fontsize=7)
+    page.insert_text((20, 260), f"Order ID: {order_id}", fontsize=8)
+    page.insert_text((190, 260), f"Weight: {rnd.randint(1, 30) / 10}kg", fontsize=8)
+    page.insert_text((20, 275), "Product Name", fontsize=7)
+    page.insert_text((90, 275), "SKU", fontsize=7)
+    page.insert_text((250, 275), "Qty", fontsize=7)
+
+def generate_waybills(output_path, pages=100, skus_per_order=2, two_page_ratio=0.1, multiplier_ratio=0.1,
+                      b1t1_ratio=0.1, split_ratio=0.1, separator_ratio=0.05, seed=1):
+    """
+    Writes a PDF of synthetic TikTok-style waybills.
+
+    Args:
+        output_path (str): Where to save the PDF.
+        pages (int): Number of pages to generate.
+        skus_per_order (int): Maximum number of product lines per order (at least 1 each).
+        two_page_ratio (float): Share of orders whose product table continues on a
+                                second page without Order ID and 'Weight:'.
+        multiplier_ratio (float): Share of product lines with an 'xN' multiplier.
+        b1t1_ratio (float): Share of product lines with a 'B1T1' SKU.
+        split_ratio (float): Share of product lines with a '/' or '+' split SKU.
+        separator_ratio (float): Share of pages without any waybill (e.g. packing separators).
+        seed (int): Random seed; the same arguments always produce the same document.
+
+    Returns:
+        dict: 'pages', 'orders' and 'product_lines' written.
+    """
+    rnd = random.Random(seed)
+    options = {'split_ratio': split_ratio, 'b1t1_ratio': b1t1_ratio, 'multiplier_ratio': multiplier_ratio}
+    doc = fitz.open()
+    order_id = 580000000000000000
+    orders = 0
+    product_lines = 0
+
+    while doc.page_count < pages:
+        if rnd.random() < separator_ratio:
+            page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            page.insert_text((30, 60), "Packing separator - no waybill on this page", fontsize=10)
+            continue
+
+        order_id += rnd.randint(1, 99999)
+        orders += 1
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        add_waybill_header(page, rnd, order_id)
+        line_count = rnd.randint(1, max(1, skus_per_order))
+        add_product_lines(page, rnd, 290, line_count, options)
+        product_lines += line_count
+
+        if doc.page_count < pages and rnd.random() < two_page_ratio:
+            page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            page.insert_text((20, 25), "Product Name (continued)", fontsize=7)
+            line_count = rnd.randint(1, max(1, skus_per_order))
+            add_product_lines(page, rnd, 40, line_count, options)
+            product_lines += line_count
+
+    # Real waybills have one content stream per page; insert_text() adds one per call
+    for page in doc:
+        page.clean_contents()
+
+    doc.save(output_path, garbage=3, deflate=True)
+    doc.close()
+    return {'pages': pages, 'orders': orders, 'product_lines': product_lines}
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a PDF of synthetic TikTok-style waybills.")
+    parser.add_argument("output_path", help="Where to save the generated PDF")
+    parser.add_argument("--pages", type=int, default=100, help="Number of pages (default: 100)")
+    parser.add_argument("--skus-per-order", type=int, default=2, help="Maximum product lines per order (default: 2)")
+    parser.add_argument("--two-page-ratio", type=float, default=0.1, help="Share of two-page orders (default: 0.1)")
+    parser.add_argument("--multiplier-ratio", type=float, default=0.1, help="Share of lines with 'xN' (default: 0.1)")
+    parser.add_argument("--b1t1-ratio", type=float, default=0.1, help="Share of 'B1T1' lines (default: 0.1)")
+    parser.add_argument("--split-ratio", type=float, default=0.1, help="Share of '/'-split lines (default: 0.1)")
+    parser.add_argument("--separator-ratio", type=float, default=0.05, help="Share of pages without a waybill (default: 0.05)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    summary = generate_waybills(args.output_path, pages=args.pages, skus_per_order=args.skus_per_order,
+                                two_page_ratio=args.two_page_ratio, multiplier_ratio=args.multiplier_ratio,
+                                b1t1_ratio=args.b1t1_ratio, split_ratio=args.split_ratio,
+                                separator_ratio=args.separator_ratio, seed=args.seed)
+    print(f"Wrote {summary['pages']} page(s), {summary['orders']} order(s) and "
+          f"{summary['product_lines']} product line(s) to '{args.output_path}'.")
@@ -62,6 +62,17 @@ WSGIEOF
 # Copy core application files
 echo "📋 Copying application files..."
 cp src/main.py "$DEPLOY_DIR/"
+cp src/extraction_cache.py "$DEPLOY_DIR/"
+cp src/sku_record.py "$DEPLOY_DIR/"
+cp src/extraction_result.py "$DEPLOY_DIR/"
+cp src/sku_aggregation.py "$DEPLOY_DIR/"
+cp src/sku_export.py "$DEPLOY_DIR/"
+cp src/run_report.py "$DEPLOY_DIR/"
+cp src/progress.py "$DEPLOY_DIR/"
+cp src/text_metrics.py "$DEPLOY_DIR/"
+cp src/summary_layout.py "$DEPLOY_DIR/"
+cp src/job_scheduler.py "$DEPLOY_DIR/"
+cp src/job_store.py "$DEPLOY_DIR/"
 cp src/flask_app.py "$DEPLOY_DIR/"
 cp requirements.txt "$DEPLOY_DIR/"
 
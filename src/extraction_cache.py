@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from sku_record import SkuRecord
+
+# Upper bound for the cached payloads; least recently used entries are evicted beyond it
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def open_cache_db(cache_path):
+    """
+    Opens (and creates if needed) the SQLite cache database.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    conn = sqlite3.connect(cache_path, timeout=10)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            cache_key TEXT PRIMARY KEY,
+            payload BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used ON extraction_cache (last_used)")
+    return conn
+
+def encode_page_batches(page_batches):
+    """
+    Serializes page batches (as yielded by iter_sku_locations) into a compressed blob.
+    The SKUs of a page all share the page's Order ID, so it is stored once per page.
+    """
+    pages = []
+    for page_batch in page_batches:
+        pages.append({
+            'page_num': page_batch['page_num'],
+            'order_id': page_batch['order_id'],
+            'has_weight': page_batch['has_weight'],
+            'is_continuation': page_batch['is_continuation'],
+            'skus': [[record.sku, record.quantity, record.x0, record.y0, record.x1, record.y1]
+                     for record in page_batch['skus']]
+        })
+    return zlib.compress(json.dumps(pages, separators=(',', ':')).encode('utf-8'))
+
+def decode_page_batches(payload):
+    """
+    Rebuilds page batches from a blob written by encode_page_batches().
+    """
+    page_batches = []
+    for page in json.loads(zlib.decompress(payload).decode('utf-8')):
+        page['skus'] = [SkuRecord(sku, quantity, page['page_num'], (x0, y0, x1, y1), page['order_id'])
+                        for sku, quantity, x0, y0, x1, y1 in page['skus']]
+        page_batches.append(page)
+    return page_batches
+
+def load_page_batches(cache_path, cache_key):
+    """
+    Looks up cached extraction results and marks them as recently used.
+
+    Returns:
+        list: The cached page batches, or None on a cache miss or cache error.
+    """
+    try:
+        conn = open_cache_db(cache_path)
+        try:
+            with conn:
+                row = conn.execute("SELECT payload FROM extraction_cache WHERE cache_key = ?",
+                                   (cache_key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE extraction_cache SET last_used = ? WHERE cache_key = ?",
+                             (time.time(), cache_key))
+            return decode_page_batches(row[0])
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+        print(f"Warning: Could not read extraction cache: {e}")
+        return None
+
+def store_page_batches(cache_path, cache_key, page_batches, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """
+    Stores extraction results, then evicts least recently used entries until the
+    cache fits in max_bytes.
+
+    Returns:
+        bool: True if the results were stored, False otherwise.
+    """
+    try:
+        payload = encode_page_batches(page_batches)
+        if len(payload) > max_bytes:
+            return False
+
+        conn = open_cache_db(cache_path)
+        try:
+            with conn:
+                now = time.time()
+                conn.execute("INSERT OR REPLACE INTO extraction_cache VALUES (?, ?, ?, ?, ?)",
+                             (cache_key, payload, len(payload), now, now))
+
+                total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+                if total_size > max_bytes:
+                    rows = conn.execute("SELECT cache_key, size FROM extraction_cache ORDER BY last_used").fetchall()
+                    for old_key, size in rows:
+                        if total_size <= max_bytes:
+                            break
+                        if old_key == cache_key:
+                            continue
+                        conn.execute("DELETE FROM extraction_cache WHERE cache_key = ?", (old_key,))
+                        total_size -= size
+            return True
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        print(f"Warning: Could not write extraction cache: {e}")
+        return False
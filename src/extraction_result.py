@@ -0,0 +1,54 @@
+class ExtractionResult:
+    """
+    Document-level result of SKU extraction.
+
+    Besides the SKU records, it keeps what extraction learned about every page, so
+    later steps (stamping, summaries) never need to read page text again:
+    pages[page_num] is a dict with 'order_id', 'has_weight' and 'is_continuation'
+    (True when the page is the second page of a two-page order).
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self.sku_locations = []
+        self.pages = {}
+
+    def add_page(self, page_batch):
+        """
+        Adds one page batch as yielded by iter_sku_locations().
+        """
+        self.pages[page_batch['page_num']] = {
+            'order_id': page_batch['order_id'],
+            'has_weight': page_batch['has_weight'],
+            'is_continuation': page_batch['is_continuation']
+        }
+        self.sku_locations.extend(page_batch['skus'])
+
+def continuation_pages(pages):
+    """
+    Returns the set of page numbers flagged as continuation pages in
+    ExtractionResult.pages.
+    """
+    return {page_num for page_num, page in pages.items() if page['is_continuation']}
+
+def continuation_pages_from_skus(sku_locations):
+    """
+    Finds two-page orders from SKU records alone, for callers without page metadata:
+    extraction gives the SKUs of a continuation page the previous page's Order ID,
+    so a page whose SKUs share a known Order ID with the previous page's SKUs
+    continues that order.
+
+    Returns:
+        set: Page numbers of continuation pages.
+    """
+    order_ids_by_page = {}
+    for sku_info in sku_locations:
+        order_ids_by_page.setdefault(sku_info['page_num'], set()).add(sku_info['order_id'])
+
+    continuation_pages = set()
+    for page_num, order_ids in order_ids_by_page.items():
+        shared_order_ids = order_ids & order_ids_by_page.get(page_num - 1, set())
+        shared_order_ids.discard("UNKNOWN_ORDER")
+        if shared_order_ids:
+            continuation_pages.add(page_num)
+    return continuation_pages
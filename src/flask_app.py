@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for, jsonify
+from flask import Flask, render_template, request, send_file, flash, redirect, url_for, jsonify, make_response, Response
 import os
 import tempfile
 import threading
@@ -9,12 +9,21 @@ import time
 import json
 import errno
 import fcntl
+import shutil
 from werkzeug.utils import secure_filename
-from main import extract_sku_locations_from_pdf, stamp_skus_on_pdf
+from main import extract_and_stamp_pdf, extract_document, export_sku_totals
+from sku_export import EXPORT_FORMATS
+from run_report import RunReport
+from job_scheduler import JobScheduler, QueueFull
+from job_store import JobStore, FINISHED_STATUSES
+from progress import PHASE_EXTRACTING, PHASE_STAMPING, PHASE_SAVING
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here-change-this'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['JOB_WORKERS'] = 2  # PDFs processed at the same time
+app.config['MAX_QUEUED_JOBS'] = 20  # Uploads waiting for a worker before new ones get HTTP 503
+app.config['PROGRESS_INTERVAL'] = 1.0  # Seconds between status updates while a job reads or stamps pages
 
 # Create upload folder in a more PythonAnywhere-friendly way
 UPLOAD_FOLDER = os.path.join(os.path.expanduser('~'), 'uploads')
@@ -23,55 +32,155 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 ALLOWED_EXTENSIONS = {'pdf'}
 
-# Global dictionary to track processing status
-processing_status = {}
+# Uploads are copied to disk in writes of this size
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+
+# Result types a job can produce: the stamped PDF, or (extract-only) a SKU export
+OUTPUT_MIMETYPES = {'pdf': 'application/pdf', 'json': 'application/json', 'csv': 'text/csv'}
+
+# Stamped PDFs are kept under UPLOAD_FOLDER and downloaded, so trade a little save
+# time for the smallest files (see SAVE_PROFILES in main.py)
+SAVE_PROFILE = 'smallest'
+
+# Part of the progress bar covered by each phase of a job; extract-only jobs
+# export their results at the end of the extraction range
+PROGRESS_RANGES = {PHASE_EXTRACTING: (20, 80), PHASE_STAMPING: (80, 90), PHASE_SAVING: (90, 99)}
+
+# Extraction results of previously seen PDFs, keyed by file content hash
+EXTRACTION_CACHE_PATH = os.path.join(UPLOAD_FOLDER, 'extraction_cache.sqlite3')
+
+# Status of all processing jobs, shared by the app's worker processes
+job_store = JobStore(os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3'))
+
+# Progress streams wake up on status changes made in this process, and re-read the
+# store at least this often to catch changes made by other processes
+STREAM_CHECK_SECONDS = 1.0
+STREAM_KEEPALIVE_SECONDS = 15
+# Streams end after this long, so none holds a web worker for a whole job; the
+# browser's EventSource reconnects after STREAM_RETRY_MS and gets a fresh one
+STREAM_MAX_SECONDS = 30
+STREAM_RETRY_MS = 1000
+
+# Runs process_pdf_background() for queued uploads, created on first use
+job_scheduler = None
+job_scheduler_lock = threading.Lock()
 
 def safe_file_save(file_obj, filepath, max_retries=3):
-    """Safely save uploaded file with retry logic for PythonAnywhere"""
+    """Safely save uploaded file with retry logic for PythonAnywhere.
+
+    The upload is copied with large buffered writes into a temporary file next to
+    filepath, synced to disk once and then renamed into place, so filepath never
+    holds a partly written upload."""
+    # Create directory if it doesn't exist
+    directory = os.path.dirname(filepath)
+    os.makedirs(directory, exist_ok=True)
+
     for attempt in range(max_retries):
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            
-            # Save file with explicit binary mode and buffering
-            with open(filepath, 'wb') as f:
-                # Read file in chunks to avoid blocking
-                chunk_size = 8192
-                while True:
-                    chunk = file_obj.read(chunk_size)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                    f.flush()  # Force write to disk
-                    os.fsync(f.fileno())  # Ensure data is written
+            # The with block closes the descriptor whatever fails inside it
+            with os.fdopen(temp_fd, 'wb', buffering=0) as f:
+                # Start over from the beginning of the upload on every attempt
+                file_obj.seek(0)
+                shutil.copyfileobj(file_obj, f, UPLOAD_BUFFER_SIZE)
+                os.fsync(f.fileno())  # Ensure data is written, once for the whole file
+            os.replace(temp_path, filepath)
             
             # Reset file pointer for potential re-use
             file_obj.seek(0)
             return True
             
         except (IOError, OSError) as e:
+            remove_quietly(temp_path)
             if e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
                 # Resource temporarily unavailable, retry
                 time.sleep(0.1 * (attempt + 1))
                 continue
             else:
                 raise e
-        except Exception as e:
-            if attempt == max_retries - 1:
-                raise e
-            time.sleep(0.1 * (attempt + 1))
+        except BaseException:
+            # Anything else is not going to succeed on a retry
+            remove_quietly(temp_path)
+            raise
     
     return False
 
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_pdf_background(task_id, filepath, filename):
-    """Process PDF in background thread with progress tracking and robust error handling"""
+def job_progress_callback(task_id, extract_message):
+    """
+    Returns a progress callback for extraction and stamping (see ProgressReporter
+    in progress.py) that turns page progress into the task's status: percentage,
+    pages per second and the time left in the current phase.
+    """
+    phase_starts = {}
+
+    def on_progress(phase, pages_done, total_pages):
+        now = time.monotonic()
+        started_at, start_pages = phase_starts.setdefault(phase, (now, pages_done))
+        low, high = PROGRESS_RANGES[phase]
+        # Saving has no pages to count, it stays at the start of its range
+        fraction = pages_done / total_pages if total_pages and phase != PHASE_SAVING else 0.0
+        status = {
+            'progress': int(low + (high - low) * fraction),
+            'phase': phase,
+            'pages_done': pages_done,
+            'total_pages': total_pages,
+            'pages_per_second': None,
+            'eta_seconds': None
+        }
+        if phase == PHASE_SAVING:
+            status['message'] = 'Adding summary pages and saving the PDF...'
+        else:
+            action = extract_message if phase == PHASE_EXTRACTING else 'Stamping pages'
+            status['message'] = f"{action}: page {pages_done} of {total_pages}"
+            elapsed = now - started_at
+            # Skip the rate of phases that are done at once (e.g. cached extraction results)
+            if pages_done > start_pages and elapsed >= 0.1:
+                pages_per_second = (pages_done - start_pages) / elapsed
+                status['pages_per_second'] = round(pages_per_second, 1)
+                status['eta_seconds'] = round((total_pages - pages_done) / pages_per_second, 1)
+                status['message'] += (f" ({pages_per_second:.1f} pages/s, "
+                                      f"about {int(status['eta_seconds'] + 0.5)} s left)")
+        job_store.update(task_id, status)
+
+    return on_progress
+
+def process_pdf_background(task_id, filepath, filename, output_format='pdf', upload_report=None, queued_at=None):
+    """Process PDF in background thread with progress tracking and robust error handling.
+
+    output_format 'pdf' stamps the SKUs onto the PDF; 'json' or 'csv' only extracts
+    and exports the SKU totals, without rendering a PDF. upload_report (the upload's
+    RunReport as a dict) and queued_at (time.perf_counter() when the job was queued)
+    add the upload-to-start latency to the job's report."""
+    # Per-stage timings and counters, shown on the processing page
+    report = RunReport()
+    if upload_report is not None:
+        report.merge(upload_report)
+    if queued_at is not None:
+        report.add_time('queue_wait', time.perf_counter() - queued_at, 0.0)
+        upload_to_start = sum(report.stages[name]['wall_seconds']
+                              for name in ('upload_receive', 'upload_save', 'queue_wait') if name in report.stages)
+        job_store.update(task_id, {'upload_to_start_seconds': round(upload_to_start, 3)})
+        print(f"Job {task_id}: started {upload_to_start:.3f}s after its upload began "
+              f"({report.counters.get('upload_bytes', 0)} bytes)")
     try:
+        # A job failed while it waited stays failed (see JobStore.update())
+        job = job_store.get(task_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            print(f"Job {task_id}: finished before it started, skipped")
+            return
+
         # Verify input file exists and is readable
         if not os.path.exists(filepath):
-            processing_status[task_id].update({
+            job_store.update(task_id, {
                 'status': 'error',
                 'progress': 100,
                 'message': 'Input file not found.',
@@ -79,36 +188,64 @@ def process_pdf_background(task_id, filepath, filename):
             })
             return
         
-        # Update status: Starting extraction
-        processing_status[task_id].update({
+        # Create output file with safer path handling
+        base_name = os.path.splitext(filename)[0]
+        output_filename = f"{base_name}_SKUs_Qty_EndPage.pdf"
+        # Jobs for uploads with the same name run at the same time, so each writes its
+        # own file; downloads still get the friendly name
+        output_path = os.path.join(UPLOAD_FOLDER, f"{task_id}_{output_filename}")
+        
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        # Update status: Starting extraction (PDF output is stamped page by page
+        # while the document is being extracted)
+        extract_message = ('Extracting SKU locations from PDF' if output_format in EXPORT_FORMATS
+                           else 'Extracting SKUs and stamping pages')
+        job_store.update(task_id, {
             'status': 'extracting',
             'progress': 20,
-            'message': 'Extracting SKU locations from PDF...'
+            'message': f'{extract_message}...',
+            # Recorded before it is written, so the job store can remove it with the job
+            'output_path': output_path if output_format not in EXPORT_FORMATS else None
         })
         
-        # Extract SKUs with error handling
+        # Extract (and stamp) SKUs with error handling, reporting progress page by page
+        on_progress = job_progress_callback(task_id, extract_message)
+        progress_interval = app.config['PROGRESS_INTERVAL']
         try:
-            sku_locations = extract_sku_locations_from_pdf(filepath)
+            if output_format in EXPORT_FORMATS:
+                extraction = extract_document(filepath, cache_path=EXTRACTION_CACHE_PATH, report=report,
+                                              progress_callback=on_progress, progress_interval=progress_interval)
+                success = False
+            else:
+                extraction, success = extract_and_stamp_pdf(filepath, output_path, cache_path=EXTRACTION_CACHE_PATH,
+                                                             report=report, save_profile=SAVE_PROFILE,
+                                                             progress_callback=on_progress,
+                                                             progress_interval=progress_interval)
         except Exception as e:
-            processing_status[task_id].update({
+            job_store.update(task_id, {
                 'status': 'error',
                 'progress': 100,
                 'message': f'Error extracting SKUs: {str(e)}',
                 'error': f'Error extracting SKUs: {str(e)}'
             })
             return
+        job_store.update(task_id, {'report': report.as_dict()})
         
-        if sku_locations is None:
-            processing_status[task_id].update({
+        if extraction is None:
+            job_store.update(task_id, {
                 'status': 'error',
                 'progress': 100,
                 'message': 'Failed to extract SKU locations from the PDF.',
                 'error': 'Failed to extract SKU locations from the PDF.'
             })
             return
+
+        sku_locations = extraction.sku_locations
             
         if not sku_locations:
-            processing_status[task_id].update({
+            job_store.update(task_id, {
                 'status': 'error',
                 'progress': 100,
                 'message': 'No SKUs were identified in the PDF using the current patterns.',
@@ -116,61 +253,17 @@ def process_pdf_background(task_id, filepath, filename):
             })
             return
         
-        # Update status: Processing SKUs
-        processing_status[task_id].update({
-            'status': 'processing',
-            'progress': 50,
-            'message': f'Found {len(sku_locations)} SKUs. Processing multi-SKU orders...'
-        })
-        
-        # Process multi-SKU orders
-        multi_sku_orders = {}
-        for sku_info in sku_locations:
-            order_id = sku_info.get('order_id', 'UNKNOWN_ORDER')
-            if order_id not in multi_sku_orders:
-                multi_sku_orders[order_id] = []
-            multi_sku_orders[order_id].append(sku_info)
-
-        filtered_multi_sku_orders = {}
-        for order_id, skus_list in multi_sku_orders.items():
-            unique_skus_in_order = set(sku_info['sku'] for sku_info in skus_list)
-            if len(unique_skus_in_order) > 1:
-                filtered_multi_sku_orders[order_id] = skus_list
-        
-        # Update status: Creating output
-        processing_status[task_id].update({
-            'status': 'stamping',
-            'progress': 80,
-            'message': 'Creating output PDF with SKU stamps...'
-        })
-        
-        # Create output file with safer path handling
-        base_name = os.path.splitext(filename)[0]
-        output_filename = f"{base_name}_SKUs_Qty_EndPage.pdf"
-        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-        
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Stamp SKUs with error handling
-        try:
-            success = stamp_skus_on_pdf(filepath, sku_locations, output_path, filtered_multi_sku_orders)
-        except Exception as e:
-            processing_status[task_id].update({
-                'status': 'error',
-                'progress': 100,
-                'message': f'Error creating output PDF: {str(e)}',
-                'error': f'Error creating output PDF: {str(e)}'
-            })
+        if output_format in EXPORT_FORMATS:
+            export_skus_background(task_id, extraction, filename, output_format, report)
             return
-        
+
         if success and os.path.exists(output_path):
             # Verify output file is readable
             try:
                 with open(output_path, 'rb') as f:
                     f.read(1024)  # Try to read first 1KB
                 
-                processing_status[task_id].update({
+                job_store.update(task_id, {
                     'status': 'completed',
                     'progress': 100,
                     'message': f'Successfully processed PDF! Found {len(sku_locations)} SKUs.',
@@ -178,14 +271,14 @@ def process_pdf_background(task_id, filepath, filename):
                     'output_filename': output_filename
                 })
             except Exception as e:
-                processing_status[task_id].update({
+                job_store.update(task_id, {
                     'status': 'error',
                     'progress': 100,
                     'message': f'Output file created but not readable: {str(e)}',
                     'error': f'Output file created but not readable: {str(e)}'
                 })
         else:
-            processing_status[task_id].update({
+            job_store.update(task_id, {
                 'status': 'error',
                 'progress': 100,
                 'message': 'Failed to create output PDF.',
@@ -193,7 +286,7 @@ def process_pdf_background(task_id, filepath, filename):
             })
     
     except Exception as e:
-        processing_status[task_id].update({
+        job_store.update(task_id, {
             'status': 'error',
             'progress': 100,
             'message': f'Error processing PDF: {str(e)}',
@@ -207,6 +300,57 @@ def process_pdf_background(task_id, filepath, filename):
         except Exception:
             pass  # Ignore cleanup errors
 
+def export_skus_background(task_id, extraction, filename, output_format, report):
+    """Extract-only jobs: write the SKU totals as JSON or CSV instead of stamping the PDF"""
+    base_name = os.path.splitext(filename)[0]
+    output_filename = f"{base_name}_SKUs.{output_format}"
+    output_path = os.path.join(UPLOAD_FOLDER, f"{task_id}_{output_filename}")
+
+    job_store.update(task_id, {
+        'status': 'exporting',
+        'progress': 80,
+        'message': f'Exporting SKU totals as {output_format.upper()}...',
+        'output_path': output_path
+    })
+
+    success = export_sku_totals(extraction, output_path, output_format, report=report, source=filename)
+    job_store.update(task_id, {'report': report.as_dict()})
+
+    if success:
+        job_store.update(task_id, {
+            'status': 'completed',
+            'progress': 100,
+            'message': f'Successfully exported SKU totals! Found {len(extraction.sku_locations)} SKUs.',
+            'output_path': output_path,
+            'output_filename': output_filename
+        })
+    else:
+        job_store.update(task_id, {
+            'status': 'error',
+            'progress': 100,
+            'message': 'Failed to write the SKU export.',
+            'error': 'Failed to write the SKU export.'
+        })
+
+def get_job_scheduler():
+    """Returns the app's job scheduler, sized from JOB_WORKERS and MAX_QUEUED_JOBS"""
+    global job_scheduler
+    with job_scheduler_lock:
+        if job_scheduler is None:
+            # Keeps queued jobs fresh, so only jobs of a dead process go stale
+            job_scheduler = JobScheduler(process_pdf_background, workers=app.config['JOB_WORKERS'],
+                                         max_queued=app.config['MAX_QUEUED_JOBS'],
+                                         heartbeat=job_store.touch,
+                                         heartbeat_seconds=job_store.stale_seconds / 4)
+        return job_scheduler
+
+def queue_full_response(scheduler):
+    """HTTP 503 with Retry-After, for uploads arriving while the job queue is full"""
+    flash('The server is busy processing other PDFs. Please try again in a moment.', 'error')
+    response = make_response(render_template('index.html'), 503)
+    response.headers['Retry-After'] = str(scheduler.retry_after_seconds())
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -216,8 +360,12 @@ def upload_file():
     if request.method == 'GET':
         return redirect(url_for('index'))
     
+    # Upload-to-start latency: receiving the request body, saving it, waiting in the queue
+    upload_report = RunReport()
+    receive_timer = upload_report.timer('upload_receive')
     print(f"Request method: {request.method}")
     print(f"Files in request: {list(request.files.keys())}")
+    receive_timer.stop()
     
     if 'file' not in request.files:
         print("No 'file' key in request.files")
@@ -233,37 +381,56 @@ def upload_file():
         flash('No file selected', 'error')
         return redirect(url_for('index'))
     
+    output_format = request.form.get('output', 'pdf')
+    if output_format not in OUTPUT_MIMETYPES:
+        flash(f'Unknown output format: {output_format}', 'error')
+        return redirect(url_for('index'))
+
     if file and allowed_file(file.filename):
+        # Refuse before storing the upload when no job can be queued
+        scheduler = get_job_scheduler()
+        if scheduler.is_full():
+            return queue_full_response(scheduler)
+
+        # Generate a unique task ID
+        import uuid
+        task_id = str(uuid.uuid4())
+
+        # Queued jobs wait for their input, so uploads with the same name must not share a file
         filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        filepath = os.path.join(UPLOAD_FOLDER, f"{task_id}_{filename}")
         
         # Use safe file saving method
         try:
-            if not safe_file_save(file, filepath):
+            with upload_report.stage('upload_save'):
+                saved = safe_file_save(file, filepath)
+            if not saved:
                 flash('Failed to save uploaded file. Please try again.', 'error')
                 return redirect(url_for('index'))
         except Exception as e:
             flash(f'Error saving file: {str(e)}', 'error')
             return redirect(url_for('index'))
-        
-        # Generate a unique task ID
-        import uuid
-        task_id = str(uuid.uuid4())
+        upload_report.count('upload_bytes', os.path.getsize(filepath))
         
         # Initialize processing status
-        processing_status[task_id] = {
-            'status': 'starting',
+        job_store.create(task_id, {
+            'status': 'queued',
             'progress': 0,
-            'message': 'Starting PDF processing...',
+            'message': 'Waiting for a free worker...',
             'filename': filename,
+            'output_format': output_format,
+            'input_path': filepath,
             'output_path': None,
             'error': None
-        }
+        })
         
-        # Start processing in background thread
-        thread = threading.Thread(target=process_pdf_background, args=(task_id, filepath, filename))
-        thread.daemon = True
-        thread.start()
+        # Queue processing on the scheduler's worker threads
+        try:
+            scheduler.submit(task_id, filepath, filename, output_format, upload_report.as_dict(), time.perf_counter())
+        except QueueFull:
+            job_store.delete(task_id)
+            os.remove(filepath)
+            return queue_full_response(scheduler)
         
         # Return processing page
         return render_template('processing.html', task_id=task_id, filename=filename)
@@ -271,24 +438,81 @@ def upload_file():
         flash('Please select a valid PDF file', 'error')
         return redirect(url_for('index'))
 
+def job_progress(task_id):
+    """
+    Returns a task's status, with queue position and ETA while it waits, or None
+    if there is no such task.
+    """
+    status = job_store.get(task_id)
+    if status is None:
+        return None
+    queue_info = get_job_scheduler().queue_info(task_id) if status['status'] == 'queued' else None
+    if queue_info is not None:
+        status = dict(status, **queue_info)
+        status['message'] = f"Waiting in queue: position {queue_info['queue_position']} of {queue_info['queue_length']}"
+        if queue_info['eta_seconds'] is not None:
+            status['message'] += f", done in about {int(queue_info['eta_seconds'] + 0.5)} s"
+    return status
+
 @app.route('/progress/<task_id>')
 def get_progress(task_id):
-    """Get processing progress for a task"""
-    if task_id in processing_status:
-        return jsonify(processing_status[task_id])
+    """Get processing progress for a task, with queue position and ETA while it waits"""
+    status = job_progress(task_id)
+    if status is not None:
+        return jsonify(status)
     else:
         return jsonify({'status': 'not_found', 'message': 'Task not found'}), 404
 
+@app.route('/progress/<task_id>/stream')
+def stream_progress(task_id):
+    """
+    Server-Sent Events stream of a task's status: sends the status whenever it
+    changes and ends once the task has completed or failed, or after
+    STREAM_MAX_SECONDS; clients reconnect for the rest. A task orphaned by a
+    dead process fails once its status goes stale (see JobStore.get()), which
+    ends its stream too.
+    """
+    if job_store.get(task_id) is None:
+        return jsonify({'status': 'not_found', 'message': 'Task not found'}), 404
+
+    def events():
+        last_data = None
+        started = last_sent = time.monotonic()
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while True:
+            # Read before the status, so a change in between ends the next wait at once
+            change_count = job_store.change_count
+            status = job_progress(task_id)
+            if status is None:
+                status = {'status': 'not_found', 'message': 'Task not found'}
+            data = json.dumps(status)
+            if data != last_data:
+                yield f"data: {data}\n\n"
+                last_data = data
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            if status['status'] in FINISHED_STATUSES or status['status'] == 'not_found':
+                return
+            if time.monotonic() - started >= STREAM_MAX_SECONDS:
+                return
+            job_store.wait_for_change(change_count, STREAM_CHECK_SECONDS)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/download/<task_id>')
 def download_result(task_id):
-    """Download the processed PDF file"""
-    if task_id in processing_status:
-        status = processing_status[task_id]
+    """Download the processed PDF file (or the SKU export of extract-only jobs)"""
+    status = job_store.get(task_id)
+    if status is not None:
         if status['status'] == 'completed' and status['output_path'] and os.path.exists(status['output_path']):
             return send_file(status['output_path'], 
                            as_attachment=True, 
                            download_name=status['output_filename'],
-                           mimetype='application/pdf')
+                           mimetype=OUTPUT_MIMETYPES[status['output_format']])
         else:
             flash('File not ready or not found', 'error')
             return redirect(url_for('index'))
@@ -449,6 +673,20 @@ if __name__ == '__main__':
             background: #3498db;
         }
         
+        .output-options {
+            margin-top: 15px;
+            text-align: center;
+        }
+        
+        .output-select {
+            display: block;
+            margin: 5px auto 0;
+            padding: 8px 12px;
+            font-size: 1em;
+            border: 1px solid #ccc;
+            border-radius: 8px;
+        }
+        
         .process-btn {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
@@ -574,6 +812,15 @@ if __name__ == '__main__':
                         </div>
                         <button type="submit" class="process-btn" id="processBtn" disabled>Process PDF</button>
                     </div>
+                    <!-- Outside the upload area, whose content is replaced when a file is picked -->
+                    <div class="output-options">
+                        <label for="outputSelect">Output:</label>
+                        <select id="outputSelect" name="output" class="output-select">
+                            <option value="pdf" selected>Stamped PDF with summary pages</option>
+                            <option value="json">SKU totals only (JSON, no PDF)</option>
+                            <option value="csv">SKU totals only (CSV, no PDF)</option>
+                        </select>
+                    </div>
                 </div>
             </form>
             
@@ -886,6 +1133,35 @@ if __name__ == '__main__':
         .error-container.show {
             display: block;
         }
+        
+        .run-report {
+            margin: 20px 0;
+            text-align: left;
+            font-size: 0.9em;
+            color: #555;
+        }
+        
+        .run-report summary {
+            cursor: pointer;
+            color: #2c3e50;
+            font-weight: 600;
+        }
+        
+        .run-report table {
+            width: 100%;
+            margin-top: 10px;
+            border-collapse: collapse;
+        }
+        
+        .run-report th, .run-report td {
+            padding: 4px 8px;
+            border-bottom: 1px solid #eee;
+        }
+        
+        .run-report td.number {
+            text-align: right;
+            font-family: monospace;
+        }
     </style>
 </head>
 <body>
@@ -926,6 +1202,17 @@ if __name__ == '__main__':
                 <p id="errorMessage"></p>
                 <a href="{{ url_for('index') }}" class="back-btn">🔄 Try Again</a>
             </div>
+            
+            <details id="runReport" class="run-report" style="display: none;">
+                <summary>⏱️ Processing details</summary>
+                <table>
+                    <thead>
+                        <tr><th>Stage</th><th>Wall (s)</th><th>CPU (s)</th><th>Calls</th></tr>
+                    </thead>
+                    <tbody id="runReportStages"></tbody>
+                </table>
+                <p id="runReportCounters" style="margin-top: 10px;"></p>
+            </details>
         </div>
     </div>
     
@@ -939,35 +1226,72 @@ if __name__ == '__main__':
         const errorContainer = document.getElementById('errorContainer');
         const downloadBtn = document.getElementById('downloadBtn');
         
+        function showRunReport(report) {
+            if (!report) {
+                return;
+            }
+            const stagesBody = document.getElementById('runReportStages');
+            stagesBody.innerHTML = '';
+            for (const [name, stage] of Object.entries(report.stages)) {
+                const row = document.createElement('tr');
+                const cells = [name, stage.wall_seconds.toFixed(3), stage.cpu_seconds.toFixed(3), stage.calls];
+                cells.forEach((value, index) => {
+                    const cell = document.createElement('td');
+                    cell.textContent = value;
+                    if (index > 0) {
+                        cell.className = 'number';
+                    }
+                    row.appendChild(cell);
+                });
+                stagesBody.appendChild(row);
+            }
+            document.getElementById('runReportCounters').textContent = Object.entries(report.counters)
+                .map(([name, amount]) => `${name}: ${amount}`)
+                .join(', ');
+            document.getElementById('runReport').style.display = 'block';
+        }
+        
+        // Shows a status update; returns true once the task has finished
+        function showProgress(data) {
+            console.log('Progress update:', data);
+            
+            // Update progress bar
+            progressBar.style.width = data.progress + '%';
+            progressText.textContent = data.progress + '%';
+            statusMessage.textContent = data.message;
+            
+            if (data.status === 'completed') {
+                // Hide processing section
+                processingSection.style.display = 'none';
+                
+                // Show success section
+                successContainer.classList.add('show');
+                document.getElementById('successMessage').textContent = data.message;
+                downloadBtn.href = `/download/${taskId}`;
+                if (data.output_format && data.output_format !== 'pdf') {
+                    downloadBtn.textContent = `📥 Download SKU Totals (${data.output_format.toUpperCase()})`;
+                }
+                showRunReport(data.report);
+                return true;
+                
+            } else if (data.status === 'error') {
+                // Hide processing section
+                processingSection.style.display = 'none';
+                
+                // Show error section
+                errorContainer.classList.add('show');
+                document.getElementById('errorMessage').textContent = data.message || data.error;
+                showRunReport(data.report);
+                return true;
+            }
+            return false;
+        }
+        
         function updateProgress() {
             fetch(`/progress/${taskId}`)
                 .then(response => response.json())
                 .then(data => {
-                    console.log('Progress update:', data);
-                    
-                    // Update progress bar
-                    progressBar.style.width = data.progress + '%';
-                    progressText.textContent = data.progress + '%';
-                    statusMessage.textContent = data.message;
-                    
-                    if (data.status === 'completed') {
-                        // Hide processing section
-                        processingSection.style.display = 'none';
-                        
-                        // Show success section
-                        successContainer.classList.add('show');
-                        document.getElementById('successMessage').textContent = data.message;
-                        downloadBtn.href = `/download/${taskId}`;
-                        
-                    } else if (data.status === 'error') {
-                        // Hide processing section
-                        processingSection.style.display = 'none';
-                        
-                        // Show error section
-                        errorContainer.classList.add('show');
-                        document.getElementById('errorMessage').textContent = data.message || data.error;
-                        
-                    } else {
+                    if (!showProgress(data)) {
                         // Continue polling
                         setTimeout(updateProgress, 1000);
                     }
@@ -978,8 +1302,35 @@ if __name__ == '__main__':
                 });
         }
         
-        // Start progress polling
-        setTimeout(updateProgress, 500);
+        // Server-Sent Events push every status change; polling is the fallback
+        // for browsers without EventSource and for streams that keep failing
+        function streamProgress() {
+            const source = new EventSource(`/progress/${taskId}/stream`);
+            let failures = 0;
+            source.onmessage = event => {
+                failures = 0;
+                const data = JSON.parse(event.data);
+                if (showProgress(data) || data.status === 'not_found') {
+                    source.close();
+                }
+            };
+            // The server ends every stream after a while and the browser reconnects on
+            // its own; only poll once it gives up or reconnecting keeps failing
+            source.onerror = () => {
+                failures++;
+                if (source.readyState === EventSource.CLOSED || failures >= 5) {
+                    source.close();
+                    console.error('Progress stream failed, polling instead');
+                    setTimeout(updateProgress, 1000);
+                }
+            };
+        }
+        
+        if (window.EventSource) {
+            streamProgress();
+        } else {
+            setTimeout(updateProgress, 500);
+        }
     </script>
 </body>
 </html>"""
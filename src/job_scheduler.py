@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+
+class QueueFull(Exception):
+    """
+    Raised by JobScheduler.submit() when no more jobs can be queued.
+    """
+
+class JobScheduler:
+    """
+    Runs background jobs on a fixed number of worker threads, taking them in
+    arrival order from a bounded queue.
+
+    Jobs beyond the worker count wait in the queue instead of all running at once
+    (and slowing each other down); once max_queued jobs are waiting, submit()
+    refuses new ones so the caller can ask clients to retry later. Waiting jobs
+    can be asked for their queue position and an ETA based on the average
+    duration of recent jobs. An optional heartbeat callback is given the waiting
+    task IDs every heartbeat_seconds, so their owner can tell they are still
+    queued.
+    """
+    # Weight of the latest job in the average job duration
+    DURATION_SMOOTHING = 0.3
+    # Retry-After suggestion while no job has finished yet
+    DEFAULT_RETRY_SECONDS = 30
+
+    def __init__(self, run_job, workers=2, max_queued=20, heartbeat=None, heartbeat_seconds=60):
+        """
+        Args:
+            run_job (callable): Called as run_job(task_id, *args) on a worker thread.
+            workers (int): Number of jobs run at the same time.
+            max_queued (int): Number of jobs that may wait for a worker.
+            heartbeat (callable): Called as heartbeat(task_ids) with the waiting
+                                  task IDs, while any are waiting.
+            heartbeat_seconds (float): Seconds between two heartbeat calls.
+        """
+        self.run_job = run_job
+        self.heartbeat = heartbeat
+        self.heartbeat_seconds = heartbeat_seconds
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.condition = threading.Condition()
+        self.waiting = deque()  # (task_id, args), oldest first
+        self.running = set()
+        self.threads = []
+        self.heartbeat_thread = None
+        self.average_job_seconds = None
+
+    def submit(self, task_id, *args):
+        """
+        Queues a job.
+
+        Returns:
+            int: The job's position in the queue (1 = next to start).
+
+        Raises:
+            QueueFull: If max_queued jobs are already waiting.
+        """
+        with self.condition:
+            if len(self.waiting) >= self.max_queued:
+                raise QueueFull(f"{len(self.waiting)} jobs are already waiting")
+            self.waiting.append((task_id, args))
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.work, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            if self.heartbeat is not None and self.heartbeat_thread is None:
+                self.heartbeat_thread = threading.Thread(target=self.beat, daemon=True)
+                self.heartbeat_thread.start()
+            self.condition.notify()
+            return len(self.waiting)
+
+    def is_full(self):
+        with self.condition:
+            return len(self.waiting) >= self.max_queued
+
+    def queue_info(self, task_id):
+        """
+        Returns the queue position of a waiting job, or None if it is not waiting.
+
+        Returns:
+            dict: 'queue_position' (1 = next to start), 'queue_length' and
+                  'eta_seconds' (estimated time until the job has finished, None
+                  until a job has finished to estimate from).
+        """
+        with self.condition:
+            position = next((index + 1 for index, (waiting_id, _) in enumerate(self.waiting)
+                             if waiting_id == task_id), None)
+            if position is None:
+                return None
+            eta_seconds = None
+            if self.average_job_seconds is not None:
+                # Jobs run in rounds of `workers`; count the rounds ahead of this one
+                rounds_ahead = (len(self.running) + position - 1) // self.workers
+                eta_seconds = (rounds_ahead + 1) * self.average_job_seconds
+            return {
+                'queue_position': position,
+                'queue_length': len(self.waiting),
+                'eta_seconds': eta_seconds
+            }
+
+    def retry_after_seconds(self):
+        """
+        Suggests when a client refused with QueueFull should try again: about the
+        time until a worker takes the next waiting job.
+        """
+        with self.condition:
+            if self.average_job_seconds is None:
+                return self.DEFAULT_RETRY_SECONDS
+            return max(1, int(self.average_job_seconds / self.workers + 0.5))
+
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.waiting:
+                    self.condition.wait()
+                task_id, args = self.waiting.popleft()
+                self.running.add(task_id)
+
+            start = time.perf_counter()
+            try:
+                self.run_job(task_id, *args)
+            except Exception as e:
+                print(f"Background job {task_id} failed: {e}")
+            finally:
+                job_seconds = time.perf_counter() - start
+                with self.condition:
+                    self.running.discard(task_id)
+                    if self.average_job_seconds is None:
+                        self.average_job_seconds = job_seconds
+                    else:
+                        self.average_job_seconds += self.DURATION_SMOOTHING * (job_seconds - self.average_job_seconds)
+
+    def beat(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            with self.condition:
+                task_ids = [task_id for task_id, _ in self.waiting]
+            if not task_ids:
+                continue
+            try:
+                self.heartbeat(task_ids)
+            except Exception as e:
+                print(f"Job queue heartbeat failed: {e}")
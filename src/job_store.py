@@ -0,0 +1,253 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Finished jobs are forgotten after this long, and their files removed
+DEFAULT_RETENTION_SECONDS = 24 * 60 * 60
+
+# Unfinished jobs not updated for this long are failed: the process that queued or
+# ran them has died (e.g. a restart), and with it the queue that would finish them.
+# Must exceed the longest stretch of a running job without a status update (summary
+# pages and save); jobs still waiting in a live queue are kept fresh with touch().
+DEFAULT_STALE_SECONDS = 60 * 60
+
+FINISHED_STATUSES = ('completed', 'error')
+
+# Fields of a job's status naming files that belong to the job; they are removed
+# together with the job
+JOB_FILE_FIELDS = ('input_path', 'output_path')
+
+STALE_JOB_MESSAGE = 'Processing stopped unexpectedly (the server may have restarted). Please upload the file again.'
+
+class JobStore:
+    """
+    Status of the web app's processing jobs, kept in a SQLite database in WAL mode
+    so every web worker process sees every job: the process that runs a job
+    writes its status, and whichever process receives /progress or /download
+    reads it. WAL lets these reads go on while a job is writing.
+
+    A job's status is a dict (status, progress, message, output_path, report, ...)
+    stored as JSON under its task ID.
+
+    Writes made by this process also wake up wait_for_change(), so progress
+    streams see them at once instead of on their next check.
+
+    The queue of waiting jobs lives in the process that accepted them, so jobs
+    whose process died stay unfinished in the store; they are failed once they
+    have not been updated (or touched) for stale_seconds.
+    """
+
+    def __init__(self, db_path, retention_seconds=DEFAULT_RETENTION_SECONDS, stale_seconds=DEFAULT_STALE_SECONDS):
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        self.stale_seconds = stale_seconds
+        self.changed = threading.Condition()
+        self.change_count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self.connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)")
+            conn.execute("BEGIN IMMEDIATE")
+            self.fail_stale_jobs(conn, time.time())
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def connect(self):
+        # Autocommit mode; writes open their own transactions
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def fail_stale_jobs(self, conn, now, task_id=None):
+        """
+        Marks unfinished jobs that have not been updated for stale_seconds as
+        failed (only the given job, if task_id is given). Runs inside the caller's
+        write transaction.
+
+        Returns:
+            int: The number of jobs failed.
+        """
+        query = "SELECT task_id, data FROM jobs WHERE updated_at < ? AND status NOT IN (?, ?)"
+        params = (now - self.stale_seconds,) + FINISHED_STATUSES
+        if task_id is not None:
+            query += " AND task_id = ?"
+            params += (task_id,)
+        rows = conn.execute(query, params).fetchall()
+        for stale_task_id, data in rows:
+            job = json.loads(data)
+            job.update({'status': 'error', 'progress': 100, 'message': STALE_JOB_MESSAGE, 'error': STALE_JOB_MESSAGE})
+            conn.execute("UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE task_id = ?",
+                         (job['status'], json.dumps(job), now, stale_task_id))
+        if rows:
+            print(f"Failed {len(rows)} job(s) not updated for {self.stale_seconds} s")
+        return len(rows)
+
+    def create(self, task_id, job):
+        """
+        Adds a job, fails stale unfinished jobs (see fail_stale_jobs()) and forgets
+        finished jobs older than the retention period, removing their files (see
+        JOB_FILE_FIELDS).
+        """
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO jobs VALUES (?, ?, ?, ?, ?)",
+                         (task_id, job['status'], json.dumps(job), now, now))
+            self.fail_stale_jobs(conn, now)
+            purge_params = (now - self.retention_seconds,) + FINISHED_STATUSES
+            purged = conn.execute("SELECT data FROM jobs WHERE updated_at < ? AND status IN (?, ?)",
+                                  purge_params).fetchall()
+            conn.execute("DELETE FROM jobs WHERE updated_at < ? AND status IN (?, ?)", purge_params)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self.notify_change()
+
+        # Only once the jobs are gone for good, so a download never finds its file missing
+        for (data,) in purged:
+            remove_job_files(json.loads(data))
+
+    def get(self, task_id):
+        """
+        Returns the job's status. A stale unfinished job is failed first (see
+        fail_stale_jobs()), so clients following an orphaned job see it end.
+
+        Returns:
+            dict: The job's status, or None if there is no such job.
+        """
+        now = time.time()
+        conn = self.connect()
+        failed = False
+        try:
+            row = conn.execute("SELECT data, status, updated_at FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if row is not None and row[1] not in FINISHED_STATUSES and row[2] < now - self.stale_seconds:
+                conn.execute("BEGIN IMMEDIATE")
+                failed = self.fail_stale_jobs(conn, now, task_id) > 0
+                row = conn.execute("SELECT data, status, updated_at FROM jobs WHERE task_id = ?",
+                                   (task_id,)).fetchone()
+                conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        if failed:
+            self.notify_change()
+        return json.loads(row[0]) if row is not None else None
+
+    def update(self, task_id, changes):
+        """
+        Merges changes into a job's status in one transaction, so concurrent updates
+        of different fields (e.g. progress and report) do not overwrite each other.
+        A finished job is left as it is: once failed (e.g. by fail_stale_jobs()), a
+        worker that is still running it cannot bring it back.
+
+        Returns:
+            dict: The updated status (unchanged if the job had finished), or None if
+                  there is no such job.
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            job = json.loads(row[0])
+            if job['status'] in FINISHED_STATUSES:
+                conn.execute("ROLLBACK")
+                return job
+            job.update(changes)
+            conn.execute("UPDATE jobs SET status = ?, data = ?, updated_at = ? WHERE task_id = ?",
+                         (job['status'], json.dumps(job), time.time(), task_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self.notify_change()
+        return job
+
+    def touch(self, task_ids):
+        """
+        Marks unfinished jobs as still cared for, e.g. jobs waiting in a live
+        process's queue, so fail_stale_jobs() leaves them alone.
+        """
+        if not task_ids:
+            return
+        conn = self.connect()
+        try:
+            conn.executemany("UPDATE jobs SET updated_at = ? WHERE task_id = ? AND status NOT IN (?, ?)",
+                             [(time.time(), task_id) + FINISHED_STATUSES for task_id in task_ids])
+        finally:
+            conn.close()
+
+    def delete(self, task_id):
+        conn = self.connect()
+        try:
+            conn.execute("DELETE FROM jobs WHERE task_id = ?", (task_id,))
+        finally:
+            conn.close()
+        self.notify_change()
+
+    def notify_change(self):
+        with self.changed:
+            self.change_count += 1
+            self.changed.notify_all()
+
+    def wait_for_change(self, change_count, timeout):
+        """
+        Waits until this process writes a job after change_count was read, or until
+        the timeout passes (writes of other processes only show up on the next read).
+
+        Args:
+            change_count (int): self.change_count as read before the caller's last get().
+            timeout (float): Longest wait in seconds.
+
+        Returns:
+            int: The current change count, to pass to the next call.
+        """
+        with self.changed:
+            if self.change_count == change_count:
+                self.changed.wait(timeout)
+            return self.change_count
+
+def remove_job_files(job):
+    """
+    Removes the files of a job's status (see JOB_FILE_FIELDS) that still exist.
+    """
+    for field in JOB_FILE_FIELDS:
+        path = job.get(field)
+        if not path:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: Could not remove job file '{path}': {e}")
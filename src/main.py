@@ -1,11 +1,201 @@
 import fitz # PyMuPDF
 import re
 import os
-import sys
+import argparse
 import time
 import errno
+import gc
+import hashlib
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from extraction_cache import file_sha256, load_page_batches, store_page_batches
+from sku_record import SkuRecord
+from extraction_result import ExtractionResult, continuation_pages, continuation_pages_from_skus
+from sku_aggregation import aggregate_skus, format_pattern, format_sku_quantity
+from sku_export import EXPORT_FORMATS, write_export
+from run_report import RunReport, activate, current_report
+from progress import (ProgressReporter, DEFAULT_PROGRESS_INTERVAL, PHASE_EXTRACTING, PHASE_STAMPING,
+                      PHASE_SAVING)
+from text_metrics import get_text_measurer
+from summary_layout import SummaryLayout, summary_section
+
+# Regex to find Order ID
+ORDER_ID_REGEX = re.compile(r'Order ID:\s*(\d+)', re.IGNORECASE)
+# Marker that only appears on the first page of a TikTok waybill
+WEIGHT_MARKER = "Weight:"
+# Regex to find initial C_ patterns (start of an SKU)
+INITIAL_C_SKU_REGEX = re.compile(r'C[ _][A-Z0-9_/\-\s]+', re.IGNORECASE)
+# Cheap page probe for SKU candidates. Words never contain whitespace, so inside a word
+# INITIAL_C_SKU_REGEX can only match 'C_' followed by an SKU character; a page whose
+# text has no such sequence cannot produce any SKU.
+SKU_CANDIDATE_PROBE_REGEX = re.compile(r'C_[A-Z0-9_/\-]', re.IGNORECASE)
+# Regex to find "xN" multipliers (e.g., x2, X5)
+X_MULTIPLIER_REGEX = re.compile(r'x(\d+)', re.IGNORECASE)
+# Regex to find numbers (potential quantities) - anchored to start/end of word
+QUANTITY_REGEX = re.compile(r'^\d+$')
+# Regex to find numbers at the end of an SKU part (e.g., '2' in 'BWL2')
+NUMBER_AT_END_OF_SKU_PART_REGEX = re.compile(r'(\d+)$')
+
+# Define search range for quantity/multiplier relative to SKU bbox
+QUANTITY_SEARCH_RANGE_X = 100 # Max horizontal distance to search for quantity (points)
+QUANTITY_SEARCH_RANGE_Y = 40 # Max vertical deviation to consider same line or line below (points)
+X_MULTIPLIER_SEARCH_RANGE_X = 150 # Extended range for 'xN' multiplier search (for external xN/qty)
+X_MULTIPLIER_SAME_LINE_Y_RANGE = 10 # Tighter vertical range for external 'xN' multiplier search
+MAX_WORDS_TO_LOOK_AHEAD_FOR_SKU_NAME = 5 # Max words to combine for multi-word SKU names
+
+# SKU aliases applied during extraction
+SKU_ALIASES = {
+    "WASH-L": "BWL",
+    "WASH-M": "BWM",
+    "BABY WASH - MILK": "BWM",
+    "BABY WASH LAVENDER": "BWL",
+    "CBV": "CBV"
+}
+
+# Rules applied to every SKU token found on a page, compiled once into SKU_RULE_ENGINE
+SKU_RULES = {
+    'prefixes': ("C_", "C "),       # Removed from the start of the SKU text
+    'separators': "/+",             # Split one SKU token into several SKUs
+    'buy_one_take_one': "B1T1",     # Removed from the SKU text, doubles the quantity
+    'aliases': SKU_ALIASES          # Matched ignoring case, spaces and dashes
+}
+
+class SkuRuleEngine:
+    """
+    The SKU rules compiled into lookup structures: precompiled patterns and a hash
+    map of normalized alias keys, so each token is processed in a single pass
+    instead of looping over the alias list for every sub-SKU.
 
-def safe_file_save(doc, output_path, max_retries=5):
+    A token's expansion does not depend on the quantity found next to it (every
+    rule multiplies it by a fixed factor), so expansions are memoized per token.
+    """
+    MAX_CACHED_TOKENS = 10000
+
+    def __init__(self, rules):
+        self.prefixes = tuple(rules['prefixes'])
+        self.separator_regex = re.compile('[' + re.escape(rules['separators']) + ']')
+        self.whitespace_regex = re.compile(r'\s+')
+        self.alias_key_regex = re.compile(r'[\s\-]+')
+        self.buy_one_take_one = rules['buy_one_take_one']
+
+        self.aliases = {}
+        for original_key, alias_value in rules['aliases'].items():
+            # First entry wins when several keys normalize to the same text
+            self.aliases.setdefault(self.alias_key(original_key), alias_value)
+
+        self.expansions = {}
+
+    def alias_key(self, sku_text):
+        return self.alias_key_regex.sub(' ', sku_text).strip().upper()
+
+    def split_multiplier(self, raw_sku_text):
+        """
+        Takes an 'xN' multiplier out of the raw SKU text (e.g. 'C_BWL x2').
+
+        Returns:
+            tuple: (SKU text without any 'xN', multiplier or 1)
+        """
+        x_match = X_MULTIPLIER_REGEX.search(raw_sku_text)
+        if not x_match:
+            return raw_sku_text, 1
+        return X_MULTIPLIER_REGEX.sub('', raw_sku_text).strip(), int(x_match.group(1))
+
+    def expand(self, sku_text):
+        """
+        Turns SKU text into the SKUs it stands for: strips the 'C_' prefix, splits on
+        '/' and '+', multiplies by trailing numbers and 'B1T1', and applies aliases.
+
+        Returns:
+            list: (sku, quantity_factor) tuples; each quantity_factor multiplies the
+                  quantity found next to the SKU.
+        """
+        expansion = self.expansions.get(sku_text)
+        if expansion is None:
+            expansion = self.compile_token(sku_text)
+            if len(self.expansions) >= self.MAX_CACHED_TOKENS:
+                self.expansions.clear()
+            self.expansions[sku_text] = expansion
+        return expansion
+
+    def compile_token(self, sku_text):
+        for prefix in self.prefixes:
+            if sku_text.startswith(prefix):
+                sku_text = sku_text[len(prefix):]
+                break
+        sku_text = self.whitespace_regex.sub(' ', sku_text).strip()
+
+        parts = self.separator_regex.split(sku_text)
+        if len(parts) > 1:
+            parts = [part.strip() for part in parts if part.strip()]
+
+        expansion = []
+        for part in parts:
+            quantity_factor = 1
+
+            match_end_number = NUMBER_AT_END_OF_SKU_PART_REGEX.search(part)
+            if match_end_number:
+                num_at_end_str = match_end_number.group(1)
+                quantity_factor *= int(num_at_end_str)
+                part = part[:-len(num_at_end_str)].strip('_-')
+            else:
+                part = part.strip('-')
+
+            if self.buy_one_take_one.upper() in part.upper():
+                part = part.replace(self.buy_one_take_one, "").replace(self.buy_one_take_one.lower(), "").strip('_-')
+                quantity_factor *= 2
+
+            expansion.append((self.aliases.get(self.alias_key(part), part), quantity_factor))
+        return expansion
+
+SKU_RULE_ENGINE = SkuRuleEngine(SKU_RULES)
+
+# Bump whenever the SKU parsing logic changes, so cached extraction results are not reused
+SKU_RULES_REVISION = 2
+
+# Space kept above the learned region of interest (points)
+ROI_MARGIN = 20
+
+# Minimum number of pages each extraction worker process should get
+MIN_PAGES_PER_WORKER = 25
+
+# Stamping modes: draw on the input pages and append the summaries to the input
+# document, or copy every page into a new document first (slower, larger output)
+STAMP_MODE_IN_PLACE = "in-place"
+STAMP_MODE_COPY = "copy"
+STAMP_MODES = (STAMP_MODE_IN_PLACE, STAMP_MODE_COPY)
+
+# Options passed to fitz.Document.save(). 'fast' only drops unused objects;
+# 'balanced' also compacts the xref, compresses uncompressed streams and packs
+# objects into object streams, which is cheap and removes most of the overhead;
+# 'smallest' also merges duplicate objects and streams (fonts, resources, the
+# wrapping streams of stamped pages) and recompresses images and fonts, which
+# takes much longer on large files.
+SAVE_PROFILES = {
+    'fast': {'garbage': 1},
+    'balanced': {'garbage': 2, 'deflate': True, 'use_objstms': 1},
+    'smallest': {'garbage': 4, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True, 'use_objstms': 1}
+}
+DEFAULT_SAVE_PROFILE = 'balanced'
+
+def sku_rules_version():
+    """
+    Returns a fingerprint of the SKU extraction rules (patterns, search ranges and
+    aliases), used to key cached extraction results.
+    """
+    rules = repr((
+        SKU_RULES_REVISION,
+        ORDER_ID_REGEX.pattern, WEIGHT_MARKER, INITIAL_C_SKU_REGEX.pattern, SKU_CANDIDATE_PROBE_REGEX.pattern,
+        X_MULTIPLIER_REGEX.pattern, QUANTITY_REGEX.pattern, NUMBER_AT_END_OF_SKU_PART_REGEX.pattern,
+        QUANTITY_SEARCH_RANGE_X, QUANTITY_SEARCH_RANGE_Y, X_MULTIPLIER_SEARCH_RANGE_X,
+        X_MULTIPLIER_SAME_LINE_Y_RANGE, MAX_WORDS_TO_LOOK_AHEAD_FOR_SKU_NAME,
+        SKU_RULES['prefixes'], SKU_RULES['separators'], SKU_RULES['buy_one_take_one'],
+        sorted(SKU_RULES['aliases'].items())
+    ))
+    return hashlib.sha256(rules.encode('utf-8')).hexdigest()[:16]
+
+def safe_file_save(doc, output_path, max_retries=5, save_options=None):
     """
     Safely save a PDF document with retry logic for PythonAnywhere compatibility.
 
@@ -13,6 +203,7 @@ def safe_file_save(doc, output_path, max_retries=5):
         doc: PyMuPDF document object
         output_path: Path where to save the file
         max_retries: Maximum number of retry attempts
+        save_options: Keyword arguments for doc.save(), e.g. a SAVE_PROFILES entry
 
     Returns:
         bool: True if successful, False otherwise
@@ -23,12 +214,13 @@ def safe_file_save(doc, output_path, max_retries=5):
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
             # Try to save the document
-            doc.save(output_path)
+            doc.save(output_path, **(save_options or {}))
             return True
 
         except OSError as e:
             if e.errno == errno.EAGAIN or "would block" in str(e):
                 print(f"Save attempt {attempt + 1} failed (resource temporarily unavailable), retrying in {0.5 * (attempt + 1)} seconds...")
+                current_report().count('save_retries')
                 time.sleep(0.5 * (attempt + 1))  # Exponential backoff
                 continue
             else:
@@ -60,6 +252,7 @@ def safe_pdf_operation(operation_func, max_retries=3, *args, **kwargs):
             if e.errno == errno.EAGAIN or "would block" in str(e) or "write could not complete" in str(e):
                 if attempt < max_retries - 1:  # Don't sleep on the last attempt
                     print(f"PDF operation attempt {attempt + 1} failed (resource temporarily unavailable), retrying in {0.5 * (attempt + 1)} seconds...")
+                    current_report().count('pdf_operation_retries')
                     time.sleep(0.5 * (attempt + 1))
                     continue
             raise  # Re-raise if it's not a blocking error or we've exhausted retries
@@ -68,454 +261,780 @@ def safe_pdf_operation(operation_func, max_retries=3, *args, **kwargs):
             raise
     return None
 
-def extract_sku_locations_from_pdf(pdf_path):
+def analyze_page(page, clip=None):
     """
-    Extracts all text from a PDF and identifies the locations of SKU codes and their quantities,
-    correctly associating them with their Order ID, especially for two-page orders.
-    Memory-optimized for large files on PythonAnywhere free tier.
+    Extracts everything the SKU scanner needs from a page using a single TextPage,
+    so MuPDF only has to assemble the page text once.
+
+    Pages without any SKU candidate (cover sheets, barcode-only or blank pages)
+    skip word extraction; their Order ID and "Weight:" flag are still recorded.
 
     Args:
-        pdf_path (str): The path to the PDF file.
+        page: PyMuPDF page object
+        clip (fitz.Rect): Optional region of interest; text outside it is ignored.
 
     Returns:
-        list: A list of dictionaries, each containing 'sku' (text), 'quantity',
-              'page_num', 'order_id', and 'bbox' (fitz.Rect).
-              Returns None if the file cannot be opened or processed.
+        dict: 'text' (str), 'words' (list of word tuples, empty if the page has no
+              SKU candidate), 'has_sku_candidates' (bool), 'order_id' (str, or
+              "UNKNOWN_ORDER" if none is printed on the page) and 'has_weight' (bool).
     """
-    try:
-        doc = safe_pdf_operation(fitz.open, 3, pdf_path)
-        if doc is None:
-            print(f"Failed to open PDF after multiple attempts: {pdf_path}")
-            return None
-        num_pages = doc.page_count
-        print(f"Reading {num_pages} page(s) from '{os.path.basename(pdf_path)}' to find SKUs and Quantities...")
-
-        # Memory optimization: Process in smaller batches for large files
-        batch_size = 10 if num_pages > 50 else num_pages
-        if num_pages > 100:
-            batch_size = 5  # Even smaller batches for very large files
-        print(f"Processing in batches of {batch_size} pages to optimize memory usage...")
-
-        # Regex to find Order ID
-        order_id_regex = re.compile(r'Order ID:\s*(\d+)', re.IGNORECASE)
-        # Regex to find initial C_ patterns (start of an SKU)
-        initial_c_sku_regex = re.compile(r'C[ _][A-Z0-9_/\-\s]+', re.IGNORECASE)
-        # Regex to find "xN" multipliers (e.g., x2, X5)
-        x_multiplier_regex = re.compile(r'x(\d+)', re.IGNORECASE)
-        # Regex to find numbers (potential quantities) - anchored to start/end of word
-        quantity_regex = re.compile(r'^\d+$')
-        # Regex to find numbers at the end of an SKU part (e.g., '2' in 'BWL2')
-        number_at_end_of_sku_part_regex = re.compile(r'(\d+)$')
-
-        # Define search range for quantity/multiplier relative to SKU bbox
-        QUANTITY_SEARCH_RANGE_X = 100 # Max horizontal distance to search for quantity (points)
-        QUANTITY_SEARCH_RANGE_Y = 40 # Max vertical deviation to consider same line or line below (points)
-        X_MULTIPLIER_SEARCH_RANGE_X = 150 # Extended range for 'xN' multiplier search (for external xN/qty)
-        X_MULTIPLIER_SAME_LINE_Y_RANGE = 10 # Tighter vertical range for external 'xN' multiplier search
-        MAX_WORDS_TO_LOOK_AHEAD_FOR_SKU_NAME = 5 # Max words to combine for multi-word SKU names
-
-        # Define SKU aliases - now used during extraction
-        sku_aliases = {
-            "WASH-L": "BWL",
-            "WASH-M": "BWM",
-            "BABY WASH - MILK": "BWM",
-            "BABY WASH LAVENDER": "BWL",
-            "CBV": "CBV"
-        }
-
-        # First pass: Extract all text and find Order IDs per page (memory optimized)
-        page_order_ids = {}
-
-        # Process pages in batches to reduce memory usage
-        for batch_start in range(0, num_pages, batch_size):
-            batch_end = min(batch_start + batch_size, num_pages)
-            print(f"Processing Order IDs for pages {batch_start + 1}-{batch_end}...")
-
-            for page_num in range(batch_start, batch_end):
-                page = safe_pdf_operation(doc.load_page, 3, page_num)
-                if page is None:
-                    print(f"Failed to load page {page_num + 1} after multiple attempts, skipping...")
-                    continue
+    textpage = page.get_textpage(clip=clip)
+    page_text = page.get_text("text", textpage=textpage)
+
+    has_sku_candidates = SKU_CANDIDATE_PROBE_REGEX.search(page_text) is not None
+    words = page.get_text("words", textpage=textpage) if has_sku_candidates else []
+
+    order_id_match = ORDER_ID_REGEX.search(page_text)
+    return {
+        'text': page_text,
+        'words': words,
+        'has_sku_candidates': has_sku_candidates,
+        'order_id': order_id_match.group(1) if order_id_match else "UNKNOWN_ORDER",
+        'has_weight': WEIGHT_MARKER in page_text
+    }
+
+def build_word_index(words):
+    """
+    Indexes a page's words by their top edge, so the quantity and 'xN' multiplier
+    lookups around an SKU become bounded range queries instead of scans over the
+    rest of the page.
 
-                page_text = safe_pdf_operation(page.get_text, 3)
-                if page_text is None:
-                    print(f"Failed to get text from page {page_num + 1} after multiple attempts, skipping...")
-                    page = None
-                    continue
-                order_id_match = order_id_regex.search(page_text)
-                if order_id_match:
-                    page_order_ids[page_num] = order_id_match.group(1)
-                else:
-                    page_order_ids[page_num] = "UNKNOWN_ORDER"
+    Args:
+        words (list): Word tuples from page.get_text("words").
 
-                # Free memory immediately after processing each page
-                page = None
+    Returns:
+        dict: 'words', 'y0s' (sorted top edges), 'order' (word indices matching 'y0s'),
+              'quantities' and 'multipliers' (value parsed from each word, or None).
+    """
+    order = sorted(range(len(words)), key=lambda i: (words[i][1], words[i][0]))
+
+    quantities = []
+    multipliers = []
+    for word in words:
+        word_text = word[4].strip()
+
+        quantity = None
+        if QUANTITY_REGEX.search(word_text):
+            quantity = int(word_text)
+            if not 0 < quantity < 1000:
+                quantity = None
+        quantities.append(quantity)
+
+        x_match = X_MULTIPLIER_REGEX.search(word_text)
+        multipliers.append(int(x_match.group(1)) if x_match else None)
+
+    return {
+        'words': words,
+        'y0s': [words[i][1] for i in order],
+        'order': order,
+        'quantities': quantities,
+        'multipliers': multipliers
+    }
+
+def find_word_value_near(word_index, values, sku_bbox, start_idx, max_distance_x, max_distance_y):
+    """
+    Looks up the first word (in reading order, from start_idx on) to the right of an
+    SKU that carries a value, e.g. a quantity or an 'xN' multiplier.
 
-            # Force garbage collection after each batch
-            import gc
-            gc.collect()
+    A candidate's left edge must be within max_distance_x right of the SKU, and its
+    top edge between the SKU's top edge and max_distance_y below it.
 
-        print("\n--- Identified Order IDs per page ---")
-        for page_num, order_id in page_order_ids.items():
-            print(f"  Page {page_num + 1}: Order ID '{order_id}'")
-        print("---------------------------------------")
+    Args:
+        word_index (dict): Index built by build_word_index().
+        values (list): Per-word values from the index ('quantities' or 'multipliers').
+        sku_bbox (fitz.Rect): Bounding box of the SKU text.
+        start_idx (int): Words before this index are not considered.
+        max_distance_x (float): Maximum horizontal gap in points.
+        max_distance_y (float): Maximum vertical offset in points.
 
-        sku_locations = []
+    Returns:
+        The value of the matching word, or None if there is none.
+    """
+    words = word_index['words']
+    order = word_index['order']
+    lo = bisect_left(word_index['y0s'], sku_bbox.y0)
+    hi = bisect_right(word_index['y0s'], sku_bbox.y0 + max_distance_y)
+
+    best_idx = None
+    for position in range(lo, hi):
+        word_idx = order[position]
+        if word_idx < start_idx or values[word_idx] is None:
+            continue
+        if best_idx is not None and word_idx > best_idx:
+            continue
+        distance_x = words[word_idx][0] - sku_bbox.x1
+        if 0 < distance_x <= max_distance_x:
+            best_idx = word_idx
+
+    return values[best_idx] if best_idx is not None else None
+
+def extract_skus_from_words(words, page_num, order_id):
+    """
+    Finds the SKU codes on a single page and works out their quantities.
 
-        # Second pass: Extract SKUs in batches for memory efficiency
-        for batch_start in range(0, num_pages, batch_size):
-            batch_end = min(batch_start + batch_size, num_pages)
-            print(f"Extracting SKUs from pages {batch_start + 1}-{batch_end}...")
+    Args:
+        words (list): Word tuples from page.get_text("words").
+        page_num (int): Zero-based page number, stored on each record.
+        order_id (str): Order ID stored on each record.
 
-            for page_num in range(batch_start, batch_end):
-                page = safe_pdf_operation(doc.load_page, 3, page_num)
-                if page is None:
-                    print(f"Failed to load page {page_num + 1} after multiple attempts, skipping...")
-                    continue
+    Returns:
+        list: SkuRecord objects, see extract_sku_locations_from_pdf.
+    """
+    sku_locations = []
+    word_index = build_word_index(words)
+    idx = 0
+    while idx < len(words):
+        x0, y0, x1, y1, word_text, _, _, _ = words[idx]
 
-                words = safe_pdf_operation(page.get_text, 3, "words")
-                if words is None:
-                    print(f"Failed to get words from page {page_num + 1} after multiple attempts, skipping...")
-                    page = None
-                    continue
+        initial_match = INITIAL_C_SKU_REGEX.search(word_text)
 
-                # Get the correct Order ID for the current page
-                order_id = page_order_ids[page_num]
-                # Handle two-page orders by checking the previous page's Order ID
-                if order_id == "UNKNOWN_ORDER" and page_num > 0:
-                    prev_order_id = page_order_ids[page_num - 1]
-                    if prev_order_id != "UNKNOWN_ORDER":
-                        # Check if previous page had a 'Weight:' and current one doesn't,
-                        # to confirm it's a two-page order split.
-                        prev_page = safe_pdf_operation(doc.load_page, 3, page_num - 1)
-                        if prev_page is not None:
-                            current_page_text = safe_pdf_operation(page.get_text, 3)
-                            prev_page_text = safe_pdf_operation(prev_page.get_text, 3)
-                            if (current_page_text is not None and prev_page_text is not None and
-                                "Weight:" in prev_page_text and "Weight:" not in current_page_text):
-                                order_id = prev_order_id
-                                print(f"  Info: Assigning Order ID '{order_id}' from page {page_num} to SKUs on page {page_num + 1}.")
-                            prev_page = None  # Free memory
-
-                idx = 0
-                while idx < len(words):
-                    x0, y0, x1, y1, word_text, _, _, _ = words[idx]
-
-                    initial_match = initial_c_sku_regex.search(word_text)
-
-                    if initial_match:
-                        current_sku_parts = [word_text.strip()]
-                        current_sku_bbox = fitz.Rect(x0, y0, x1, y1)
-
-                        look_ahead_idx = idx + 1
-                        while look_ahead_idx < len(words) and \
-                              look_ahead_idx < idx + MAX_WORDS_TO_LOOK_AHEAD_FOR_SKU_NAME:
-
-                            next_word_info = words[look_ahead_idx]
-                            nox0, noy0, nox1, noy1, next_word_text, _, _, _ = next_word_info
-
-                            if abs(noy0 - y0) <= QUANTITY_SEARCH_RANGE_Y and \
-                               (nox0 - x0) < X_MULTIPLIER_SEARCH_RANGE_X + 50 and \
-                               not quantity_regex.search(next_word_text.strip()):
-
-                                current_sku_parts.append(next_word_text.strip())
-                                current_sku_bbox = current_sku_bbox | fitz.Rect(nox0, noy0, nox1, noy1)
-                                look_ahead_idx += 1
-                            else:
-                                break
-
-                        sku_found_raw = " ".join(current_sku_parts).strip()
-
-                        base_quantity = 1
-                        x_multiplier_value = 1
-
-                        temp_sku_string = sku_found_raw
-                        x_match_in_sku = x_multiplier_regex.search(temp_sku_string)
-                        if x_match_in_sku:
-                            try:
-                                x_multiplier_value = int(x_match_in_sku.group(1))
-                                temp_sku_string = x_multiplier_regex.sub('', temp_sku_string).strip()
-                            except ValueError:
-                                pass
-
-                        found_base_qty_for_current_sku = False
-                        qty_search_start_idx = look_ahead_idx
-                        for j in range(qty_search_start_idx, len(words)):
-                            other_word_info = words[j]
-                            ox0, oy0, ox1, oy1, other_word_text, _, _, _ = other_word_info
-
-                            if (oy0 >= current_sku_bbox.y0 and abs(oy0 - current_sku_bbox.y0) <= QUANTITY_SEARCH_RANGE_Y and
-                                ox0 > current_sku_bbox.x1 and (ox0 - current_sku_bbox.x1) <= QUANTITY_SEARCH_RANGE_X):
-
-                                qty_match = quantity_regex.search(other_word_text.strip())
-                                if qty_match:
-                                    try:
-                                        potential_qty = int(qty_match.group(0))
-                                        if 0 < potential_qty < 1000:
-                                            base_quantity = potential_qty
-                                            found_base_qty_for_current_sku = True
-                                            break
-                                    except ValueError:
-                                        pass
-                            elif (ox0 - current_sku_bbox.x1) > QUANTITY_SEARCH_RANGE_X + 50:
-                                break
-
-                        xN_search_start_idx = qty_search_start_idx
-                        for j in range(xN_search_start_idx, len(words)):
-                            other_word_info = words[j]
-                            ox0, oy0, ox1, oy1, other_word_text, _, _, _ = other_word_info
-
-                            if (oy0 >= current_sku_bbox.y0 and abs(oy0 - current_sku_bbox.y0) <= X_MULTIPLIER_SAME_LINE_Y_RANGE and
-                                ox0 > current_sku_bbox.x1 and (ox0 - current_sku_bbox.x1) <= X_MULTIPLIER_SEARCH_RANGE_X):
-
-                                x_match_external = x_multiplier_regex.search(other_word_text.strip())
-                                if x_match_external:
-                                    try:
-                                        x_multiplier_value *= int(x_match_external.group(1))
-                                        break
-                                    except ValueError:
-                                        pass
-                            elif (ox0 - current_sku_bbox.x1) > X_MULTIPLIER_SEARCH_RANGE_X + 50:
-                                break
-
-                        initial_combined_quantity = base_quantity * x_multiplier_value
-                        processed_sku_string = temp_sku_string
-                        if processed_sku_string.startswith("C_"):
-                            processed_sku_string = processed_sku_string[2:]
-                        elif processed_sku_string.startswith("C "):
-                            processed_sku_string = processed_sku_string[2:]
-
-                        processed_sku_string = re.sub(r'\s+', ' ', processed_sku_string).strip()
-
-                        if '/' in processed_sku_string or '+' in processed_sku_string:
-                            # Split by both '/' and '+' as separators
-                            sub_skus = [s.strip() for s in re.split(r'[/+]', processed_sku_string) if s.strip()]
-                            for sub_sku in sub_skus:
-                                current_sku_part_quantity = initial_combined_quantity
-
-                                stripped_sub_sku = sub_sku.strip()
-                                match_end_number = number_at_end_of_sku_part_regex.search(stripped_sub_sku)
-                                if match_end_number:
-                                    num_at_end_str = match_end_number.group(1)
-                                    try:
-                                        num_at_end_int = int(num_at_end_str)
-                                        current_sku_part_quantity *= num_at_end_int
-                                        sub_sku = stripped_sub_sku[:-len(num_at_end_str)].strip('_-')
-                                    except ValueError:
-                                        sub_sku = stripped_sub_sku.strip('-')
-                                else:
-                                    sub_sku = stripped_sub_sku.strip('-')
-
-                                if "B1T1" in sub_sku.upper():
-                                    sub_sku = sub_sku.replace("B1T1", "").replace("b1t1", "").strip('_-')
-                                    current_sku_part_quantity *= 2
-
-                                normalized_sku_for_lookup = re.sub(r'[\s\-]+', ' ', sub_sku).strip().upper()
-                                for original_key, alias_value in sku_aliases.items():
-                                    if normalized_sku_for_lookup == re.sub(r'[\s\-]+', ' ', original_key).strip().upper():
-                                        sub_sku = alias_value
-                                        break
-
-                                sku_locations.append({
-                                    'sku': sub_sku,
-                                    'quantity': current_sku_part_quantity,
-                                    'page_num': page_num,
-                                    'bbox': current_sku_bbox,
-                                    'order_id': order_id
-                                })
-                        else:
-                            current_sku_quantity = initial_combined_quantity
-
-                            stripped_sku_text = processed_sku_string.strip()
-                            match_end_number = number_at_end_of_sku_part_regex.search(stripped_sku_text)
-                            if match_end_number:
-                                num_at_end_str = match_end_number.group(1)
-                                try:
-                                    num_at_end_int = int(num_at_end_str)
-                                    current_sku_quantity *= num_at_end_int
-                                    processed_sku_string = stripped_sku_text[:-len(num_at_end_str)].strip('_-')
-                                except ValueError:
-                                    processed_sku_string = stripped_sku_text.strip('-')
-                            else:
-                                processed_sku_string = stripped_sku_text.strip('-')
-
-                            if "B1T1" in processed_sku_string.upper():
-                                processed_sku_string = processed_sku_string.replace("B1T1", "").replace("b1t1", "").strip('_-')
-                                current_sku_quantity *= 2
-
-                            normalized_sku_for_lookup = re.sub(r'[\s\-]+', ' ', processed_sku_string).strip().upper()
-                            for original_key, alias_value in sku_aliases.items():
-                                if normalized_sku_for_lookup == re.sub(r'[\s\-]+', ' ', original_key).strip().upper():
-                                    processed_sku_string = alias_value
-                                    break
-
-                            sku_locations.append({
-                                'sku': processed_sku_string,
-                                'quantity': current_sku_quantity,
-                                'page_num': page_num,
-                                'bbox': current_sku_bbox,
-                                'order_id': order_id
-                            })
-                        idx = look_ahead_idx
-                    else:
-                        idx += 1
-
-            # Free memory for page objects after processing each page (move outside the while loop)
-            page = None
-            words = None
+        if initial_match:
+            current_sku_parts = [word_text.strip()]
+            current_sku_bbox = fitz.Rect(x0, y0, x1, y1)
 
-        # Force garbage collection after each batch
-        import gc
-        gc.collect()
+            look_ahead_idx = idx + 1
+            while look_ahead_idx < len(words) and \
+                  look_ahead_idx < idx + MAX_WORDS_TO_LOOK_AHEAD_FOR_SKU_NAME:
 
-        doc.close()
-    except FileNotFoundError:
-        print(f"Error: The file '{pdf_path}' was not found.")
+                next_word_info = words[look_ahead_idx]
+                nox0, noy0, nox1, noy1, next_word_text, _, _, _ = next_word_info
+
+                if abs(noy0 - y0) <= QUANTITY_SEARCH_RANGE_Y and \
+                   (nox0 - x0) < X_MULTIPLIER_SEARCH_RANGE_X + 50 and \
+                   not QUANTITY_REGEX.search(next_word_text.strip()):
+
+                    current_sku_parts.append(next_word_text.strip())
+                    current_sku_bbox = current_sku_bbox | fitz.Rect(nox0, noy0, nox1, noy1)
+                    look_ahead_idx += 1
+                else:
+                    break
+
+            sku_found_raw = " ".join(current_sku_parts).strip()
+
+            base_quantity = 1
+            temp_sku_string, x_multiplier_value = SKU_RULE_ENGINE.split_multiplier(sku_found_raw)
+
+            # Quantity: nearest number to the right, on the same line or slightly below
+            qty_search_start_idx = look_ahead_idx
+            found_quantity = find_word_value_near(word_index, word_index['quantities'], current_sku_bbox,
+                                                  qty_search_start_idx, QUANTITY_SEARCH_RANGE_X, QUANTITY_SEARCH_RANGE_Y)
+            if found_quantity is not None:
+                base_quantity = found_quantity
+
+            # External 'xN' multiplier: must be on the same line, but may sit further right
+            found_multiplier = find_word_value_near(word_index, word_index['multipliers'], current_sku_bbox,
+                                                    qty_search_start_idx, X_MULTIPLIER_SEARCH_RANGE_X, X_MULTIPLIER_SAME_LINE_Y_RANGE)
+            if found_multiplier is not None:
+                x_multiplier_value *= found_multiplier
+
+            initial_combined_quantity = base_quantity * x_multiplier_value
+            for sku_text, quantity_factor in SKU_RULE_ENGINE.expand(temp_sku_string):
+                sku_locations.append(SkuRecord(sku_text, initial_combined_quantity * quantity_factor, page_num,
+                                               current_sku_bbox, order_id))
+            idx = look_ahead_idx
+        else:
+            idx += 1
+    return sku_locations
+
+def learn_region_of_interest(page_rect, page_info, skus):
+    """
+    Derives the region of interest for clipped extraction from a fully analyzed
+    waybill page: a full-width band from just above the topmost of the Order ID,
+    'Weight:' and SKU text down to the bottom of the page, since the SKU table grows
+    downwards with the number of items.
+
+    Args:
+        page_rect (fitz.Rect): The page's rectangle.
+        page_info (dict): Result of analyze_page() for the page, without clipping.
+        skus (list): SkuRecord objects found on the page.
+
+    Returns:
+        fitz.Rect: The learned region, or None if the page is not a complete waybill
+                   page (Order ID, 'Weight:' and at least one SKU) to learn from.
+    """
+    if not skus or page_info['order_id'] == "UNKNOWN_ORDER" or not page_info['has_weight']:
         return None
-    except Exception as e:
-        print(f"An error occurred while reading the PDF: {e}")
+
+    order_id_tops = [word[1] for word in page_info['words'] if page_info['order_id'] in word[4]]
+    weight_tops = [word[1] for word in page_info['words'] if WEIGHT_MARKER in word[4]]
+    if not order_id_tops or not weight_tops:
         return None
-    return sku_locations
 
-def stamp_skus_on_pdf(input_pdf_path, sku_locations, output_pdf_path, multi_sku_orders_to_stamp):
+    top = min(order_id_tops + weight_tops + [record.y0 for record in skus]) - ROI_MARGIN
+    return fitz.Rect(page_rect.x0, max(page_rect.y0, top), page_rect.x1, page_rect.y1)
+
+def scan_pages(doc, page_numbers, roi=None):
     """
-    Stamps the identified SKU codes and their quantities onto a new PDF document,
-    including a summary page at the end. Memory-optimized for large files.
+    Analyzes the given pages of an open document and extracts their SKUs, one page at a time.
+
+    Each page's SKUs carry the Order ID printed on that page; continuation pages of
+    two-page orders are resolved afterwards by resolve_two_page_orders(), since that
+    needs the previous page's result.
+
+    With a region of interest, text is only extracted inside it. A page where the
+    region does not contain an Order ID, 'Weight:' and an SKU candidate (e.g.
+    continuation or separator pages, or a template whose SKU table lies outside the
+    region) is analyzed again in full.
+
+    Args:
+        doc: PyMuPDF document object
+        page_numbers (range): Zero-based page numbers to scan, in order.
+        roi (fitz.Rect or str): Region of interest covering the Order ID, 'Weight:' and
+                                the SKU table, or "auto" to learn it from the first
+                                complete waybill page. None scans whole pages.
+
+    Yields:
+        dict: One page result per readable page with 'page_num', 'order_id',
+              'has_weight' and 'skus'.
     """
-    try:
-        doc = safe_pdf_operation(fitz.open, 3, input_pdf_path)
-        if doc is None:
-            print(f"Failed to open input PDF after multiple attempts: {input_pdf_path}")
-            return False
+    report = current_report()
+    page_numbers = list(page_numbers)
+    learn_roi = isinstance(roi, str) and roi == "auto"
+    clip = None if roi is None or learn_roi else fitz.Rect(roi)
+
+    # Memory optimization: Process in smaller batches for large files
+    batch_size = 10 if len(page_numbers) > 50 else max(len(page_numbers), 1)
+    if len(page_numbers) > 100:
+        batch_size = 5  # Even smaller batches for very large files
+
+    for batch_start in range(0, len(page_numbers), batch_size):
+        batch = page_numbers[batch_start:batch_start + batch_size]
+        print(f"Extracting Order IDs and SKUs from pages {batch[0] + 1}-{batch[-1] + 1}...")
+
+        for page_num in batch:
+            page = safe_pdf_operation(doc.load_page, 3, page_num)
+            if page is None:
+                print(f"Failed to load page {page_num + 1} after multiple attempts, skipping...")
+                continue
 
-        output_doc = safe_pdf_operation(fitz.open, 3)
-        if output_doc is None:
-            print("Failed to create output PDF after multiple attempts")
-            return False
+            page_info = None
+            with report.stage('text_extraction'):
+                if clip is not None:
+                    page_info = safe_pdf_operation(analyze_page, 3, page, clip)
+                    if page_info is not None and (page_info['order_id'] == "UNKNOWN_ORDER" or not page_info['has_weight']
+                                                  or not page_info['has_sku_candidates']):
+                        page_info = None  # Nothing found in the region of interest, fall back to the full page
+                        report.count('roi_fallbacks')
+                if page_info is None:
+                    page_info = safe_pdf_operation(analyze_page, 3, page)
+            if page_info is None:
+                print(f"Failed to get text from page {page_num + 1} after multiple attempts, skipping...")
+                report.count('pages_failed')
+                page = None
+                continue
 
-        # Memory optimization: Process pages in batches
-        total_pages = doc.page_count
-        batch_size = 10 if total_pages > 50 else total_pages
-        if total_pages > 100:
-            batch_size = 5
-        print(f"Stamping PDFs in batches of {batch_size} pages for memory optimization...")
-
-        font_name = "helv"
-        font_size = 12
-        MIN_FONT_SIZE = 8
-
-        global_aggregated_skus = {}
-
-        skus_by_page = {}
-        for sku_info in sku_locations:
-            page_num = sku_info['page_num']
-            if page_num not in skus_by_page:
-                skus_by_page[page_num] = []
-            skus_by_page[page_num].append(sku_info)
-
-        # Process pages in batches to reduce memory usage
-        for batch_start in range(0, total_pages, batch_size):
-            batch_end = min(batch_start + batch_size, total_pages)
-            print(f"Processing PDF pages {batch_start + 1}-{batch_end}...")
-
-            for page_num in range(batch_start, batch_end):
-                page = safe_pdf_operation(doc.load_page, 3, page_num)
-                if page is None:
-                    print(f"Failed to load page {page_num + 1} for stamping after multiple attempts, skipping...")
-                    continue
+            skus = []
+            if page_info['has_sku_candidates']:
+                with report.stage('sku_parsing'):
+                    skus = extract_skus_from_words(page_info['words'], page_num, page_info['order_id'])
+                report.count('words_scanned', len(page_info['words']))
+                report.count('skus_found', len(skus))
+            else:
+                report.count('pages_without_sku_candidates')
+            report.count('pages_extracted')
+
+            if learn_roi and clip is None:
+                clip = learn_region_of_interest(page.rect, page_info, skus)
+                if clip is not None:
+                    print(f"Learned SKU region of interest from page {page_num + 1}: {tuple(round(v, 1) for v in clip)}")
+            page = None  # Free memory, everything needed is in page_info
+
+            yield {
+                'page_num': page_num,
+                'order_id': page_info['order_id'],
+                'has_weight': page_info['has_weight'],
+                'skus': skus
+            }
+            page_info = None
 
-                output_page = safe_pdf_operation(output_doc.new_page, 3,
-                    width=page.rect.width, height=page.rect.height)
-                if output_page is None:
-                    print(f"Failed to create output page {page_num + 1} after multiple attempts, skipping...")
-                    page = None
-                    continue
+        # Force garbage collection after each batch
+        gc.collect()
 
-                # Use safe operation for showing PDF page
-                try:
-                    safe_pdf_operation(output_page.show_pdf_page, 3, page.rect, doc, page_num)
-                except Exception as e:
-                    print(f"Failed to copy page {page_num + 1} content after multiple attempts: {e}")
-                    page = None
-                    continue
+def extract_page_range(pdf_path, start_page, end_page, roi=None):
+    """
+    Worker entry point for parallel extraction: opens the PDF in this process
+    and scans pages start_page to end_page - 1.
+
+    Returns:
+        tuple: (page results as yielded by scan_pages(), the range's run report as a dict)
+    """
+    report = RunReport()
+    with activate(report):
+        with report.stage('extract_open'):
+            doc = safe_pdf_operation(fitz.open, 3, pdf_path)
+        try:
+            return list(scan_pages(doc, range(start_page, end_page), roi)), report.as_dict()
+        finally:
+            doc.close()
+
+def resolve_two_page_orders(page_results):
+    """
+    Assigns the previous page's Order ID to the SKUs of continuation pages.
+
+    A page is the second half of a two-page order when it has no Order ID of its
+    own, the previous page has one, and only the previous page has 'Weight:'.
+    Only the previous page's result is needed, so pages are passed on as they arrive.
+
+    Args:
+        page_results (iterable): Page results in page order, as yielded by scan_pages().
 
-                bottom_margin = 20
-                left_margin = 20
+    Yields:
+        dict: Each page result with 'is_continuation' added. On continuation pages,
+              'order_id' and the SKUs' 'order_id' are the previous page's Order ID.
+    """
+    prev_result = None
+    for page_result in page_results:
+        page_num = page_result['page_num']
+        page_result['is_continuation'] = False
+
+        if (page_result['order_id'] == "UNKNOWN_ORDER" and prev_result is not None and
+            prev_result['page_num'] == page_num - 1 and
+            prev_result['order_id'] != "UNKNOWN_ORDER" and
+            prev_result['has_weight'] and not page_result['has_weight']):
+            order_id = prev_result['order_id']
+            print(f"  Info: Assigning Order ID '{order_id}' from page {page_num} to SKUs on page {page_num + 1}.")
+            page_result['order_id'] = order_id
+            page_result['is_continuation'] = True
+            for sku_info in page_result['skus']:
+                sku_info['order_id'] = order_id
+        else:
+            print(f"  Page {page_num + 1}: Order ID '{page_result['order_id']}'")
 
-                page_aggregated_skus = {}
+        prev_result = page_result
+        yield page_result
 
-                if page_num in skus_by_page:
-                    for sku_info in skus_by_page[page_num]:
-                        sku_text = sku_info['sku']
-                        sku_quantity = sku_info['quantity']
+def iter_pages_in_parallel(pdf_path, num_pages, workers, roi=None):
+    """
+    Scans the document with a pool of worker processes, one contiguous page range each,
+    and yields the page results in page order as each range completes. Ranges whose
+    worker fails are scanned in this process instead.
 
-                        if sku_text in page_aggregated_skus:
-                            page_aggregated_skus[sku_text] += sku_quantity
-                        else:
-                            page_aggregated_skus[sku_text] = sku_quantity
+    Yields:
+        dict: Page results as yielded by scan_pages().
+    """
+    shard_size = -(-num_pages // workers)  # ceiling division
+    shards = [(start, min(start + shard_size, num_pages)) for start in range(0, num_pages, shard_size)]
+    print(f"Extracting with {workers} worker processes ({len(shards)} page ranges of up to {shard_size} pages)...")
+
+    report = current_report()
+    report.count('workers', len(shards))
+    executor = None
+    futures = []
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = [executor.submit(extract_page_range, pdf_path, start, end, roi) for start, end in shards]
+    except OSError as e:
+        print(f"Parallel extraction unavailable ({e}), falling back to a single process...")
 
-                        if sku_text in global_aggregated_skus:
-                            global_aggregated_skus[sku_text] += sku_quantity
-                        else:
-                            global_aggregated_skus[sku_text] = sku_quantity
+    try:
+        for shard_idx, (start, end) in enumerate(shards):
+            shard_result = None
+            if shard_idx < len(futures):
+                try:
+                    with report.stage('worker_wait'):
+                        shard_result = futures[shard_idx].result()
+                except (OSError, BrokenProcessPool) as e:
+                    print(f"Worker for pages {start + 1}-{end} failed ({e}), scanning them in this process...")
+                    report.count('worker_failures')
+            if shard_result is None:
+                shard_result = extract_page_range(pdf_path, start, end, roi)
+            page_results, shard_report = shard_result
+            report.merge(shard_report)
+            yield from page_results
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def iter_sku_locations(pdf_path, workers=1, cache_path=None, roi=None, progress=None):
+    """
+    Streams the SKUs of a PDF page by page, so callers can start working on the
+    first pages while the rest of the document is still being parsed. Two-page
+    orders are resolved inside the stream.
 
-                final_skus_to_stamp_on_this_page = []
-                for sku, total_qty in page_aggregated_skus.items():
-                    final_skus_to_stamp_on_this_page.append(f"{sku} (x{total_qty})")
+    Args:
+        pdf_path (str): The path to the PDF file.
+        workers (int): Number of worker processes. With more than one, the document is
+                       split into contiguous page ranges that are extracted in parallel,
+                       each worker opening the PDF itself. 0 uses every CPU core.
+        cache_path (str): Optional SQLite file caching extraction results by the SHA-256
+                          of the PDF contents and the SKU rules version. A cache hit
+                          replays the stored pages without opening the PDF.
+        roi (fitz.Rect or str): Optional region of interest (clip rectangle) covering
+                                the Order ID, 'Weight:' and the SKU table, or "auto" to
+                                learn it from the first complete waybill page. Pages
+                                where nothing is found inside it are read in full.
+        progress (ProgressReporter): Optional reporter advanced after each page has
+                                     been consumed, in the 'extracting' phase.
+
+    Yields:
+        dict: One batch per readable page, in page order, with 'page_num', 'order_id',
+              'has_weight', 'is_continuation' and 'skus' (a list of SkuRecord objects,
+              see extract_sku_locations_from_pdf).
+
+    Raises:
+        FileNotFoundError, RuntimeError: If the PDF cannot be opened.
+    """
+    report = current_report()
+    if progress is None:
+        progress = ProgressReporter()
+    if cache_path:
+        with report.stage('cache_lookup'):
+            cache_key = f"{file_sha256(pdf_path)}:{sku_rules_version()}"
+            if roi is not None:
+                cache_key += f":roi={roi if isinstance(roi, str) else tuple(fitz.Rect(roi))}"
+            cached_page_batches = load_page_batches(cache_path, cache_key)
+        if cached_page_batches is not None:
+            print(f"Using cached extraction results for '{os.path.basename(pdf_path)}' ({len(cached_page_batches)} page(s)).")
+            report.count('cache_hits')
+            progress.start(PHASE_EXTRACTING, cached_page_batches[-1]['page_num'] + 1 if cached_page_batches else 0)
+            for page_batch in cached_page_batches:
+                yield page_batch
+                progress.advance(page_batch['page_num'] + 1)
+            return
+
+        report.count('cache_misses')
+        page_batches = []
+        for page_batch in iter_sku_locations(pdf_path, workers=workers, roi=roi, progress=progress):
+            page_batches.append(page_batch)
+            yield page_batch
+        with report.stage('cache_store'):
+            store_page_batches(cache_path, cache_key, page_batches)
+        return
 
-                final_skus_to_stamp_on_this_page.sort()
+    with report.stage('extract_open'):
+        doc = safe_pdf_operation(fitz.open, 3, pdf_path)
+    if doc is None:
+        raise RuntimeError(f"Failed to open PDF after multiple attempts: {pdf_path}")
+    num_pages = doc.page_count
+    print(f"Reading {num_pages} page(s) from '{os.path.basename(pdf_path)}' to find SKUs and Quantities...")
+
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    # Not worth starting processes for a handful of pages per worker
+    workers = max(1, min(workers, num_pages // MIN_PAGES_PER_WORKER))
+
+    progress.start(PHASE_EXTRACTING, num_pages)
+    if workers > 1:
+        doc.close()
+        doc = None
+        page_results = iter_pages_in_parallel(pdf_path, num_pages, workers, roi)
+    else:
+        page_results = scan_pages(doc, range(num_pages), roi)
 
-                if final_skus_to_stamp_on_this_page:
-                    final_text_to_stamp = "\n".join(final_skus_to_stamp_on_this_page)
+    try:
+        for page_batch in resolve_two_page_orders(page_results):
+            yield page_batch
+            progress.advance(page_batch['page_num'] + 1)
+    finally:
+        if doc is not None:
+            doc.close()
+
+def extract_document(pdf_path, workers=1, cache_path=None, roi=None, report=None, progress_callback=None,
+                     progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """
+    Extracts the SKU locations of a PDF together with what was learned about each
+    page (Order ID, 'Weight:', two-page continuation), so stamping does not have to
+    read the page text again.
 
-                    max_line_width = 0
-                    num_lines = 0
+    Args:
+        pdf_path (str): The path to the PDF file.
+        workers (int): Number of extraction worker processes, see iter_sku_locations().
+        cache_path (str): Optional extraction cache database, see iter_sku_locations().
+        roi (fitz.Rect or str): Optional region of interest, see iter_sku_locations().
+        report (RunReport): Optional report receiving per-stage timings and counters
+                            (pages, words, SKUs, retries, ...).
+        progress_callback (callable): Optional, called as progress_callback(phase,
+                                      pages_done, total_pages) while pages are read,
+                                      see ProgressReporter.
+        progress_interval (float): Seconds between two progress calls.
 
-                    try:
-                        lines = final_text_to_stamp.split('\n')
-                        if lines:
-                            max_line_width = max(fitz.get_text_length(line, fontname=font_name, fontsize=font_size) for line in lines)
-                        num_lines = len(lines)
-                    except Exception as e:
-                        print(f"Warning: Error calculating text dimensions: {e}. Using default size for background.")
-                        max_line_width = 100
-                        num_lines = 1
+    Returns:
+        ExtractionResult: With 'sku_locations' (see extract_sku_locations_from_pdf) and
+                          'pages' (per-page 'order_id', 'has_weight', 'is_continuation').
+                          Returns None if the file cannot be opened or processed.
+    """
+    try:
+        result = ExtractionResult(pdf_path)
+        with activate(report) as report, report.stage('extraction_total'):
+            progress = ProgressReporter(progress_callback, progress_interval)
+            for page_batch in iter_sku_locations(pdf_path, workers=workers, cache_path=cache_path, roi=roi,
+                                                 progress=progress):
+                result.add_page(page_batch)
+    except FileNotFoundError:
+        print(f"Error: The file '{pdf_path}' was not found.")
+        return None
+    except Exception as e:
+        print(f"An error occurred while reading the PDF: {e}")
+        return None
+    return result
 
-                    padding_x = 10
-                    padding_y = 5
+def extract_sku_locations_from_pdf(pdf_path, workers=1, cache_path=None, roi=None, report=None, progress_callback=None,
+                                   progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """
+    Extracts all text from a PDF and identifies the locations of SKU codes and their quantities,
+    correctly associating them with their Order ID, especially for two-page orders.
+    Memory-optimized for large files on PythonAnywhere free tier.
 
-                    background_width = max_line_width + (2 * padding_x)
-                    background_height = (num_lines * font_size * 1.4) + (2 * padding_y)
+    Args:
+        pdf_path (str): The path to the PDF file.
+        workers, cache_path, roi, report, progress_callback, progress_interval: See extract_document().
 
-                    rect_x0 = left_margin
-                    rect_x1 = rect_x0 + background_width
+    Returns:
+        list: A list of SkuRecord objects. Like dictionaries, each gives access to
+              'sku' (text), 'quantity', 'page_num', 'order_id', and 'bbox' (fitz.Rect).
+              Returns None if the file cannot be opened or processed.
+    """
+    result = extract_document(pdf_path, workers=workers, cache_path=cache_path, roi=roi, report=report,
+                              progress_callback=progress_callback, progress_interval=progress_interval)
+    return None if result is None else result.sku_locations
 
-                    rect_y1 = output_page.rect.height - bottom_margin
-                    rect_y0 = rect_y1 - background_height
+def stamp_skus_on_pdf(input_pdf_path, sku_locations, output_pdf_path, multi_sku_orders_to_stamp, report=None,
+                      mode=STAMP_MODE_IN_PLACE, pages=None, save_profile=DEFAULT_SAVE_PROFILE, progress_callback=None,
+                      progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """
+    Stamps the identified SKU codes and their quantities onto the waybill pages and
+    saves them to output_pdf_path, with summary pages at the end. Memory-optimized
+    for large files.
 
-                    background_rect = fitz.Rect(rect_x0, rect_y0, rect_x1, rect_y1)
+    Args:
+        report (RunReport): Optional report receiving per-stage timings (page copying,
+                            stamping, summary layout, saving) and counters.
+        mode (str): STAMP_MODE_IN_PLACE draws directly on the pages of the input
+                    document and appends the summary pages to it. STAMP_MODE_COPY
+                    copies every page into a new document first, wrapping each one
+                    in a Form XObject, which is slower and makes the output larger.
+        pages (dict): Optional per-page results of the extraction (ExtractionResult.pages).
+                      Two-page orders are taken from their continuation flags; without
+                      them, from SKUs sharing an Order ID with the previous page.
+        save_profile (str): One of SAVE_PROFILES, trading save time for output size.
+                            The report's 'save' stage and 'output_bytes' counter show
+                            the result.
+        progress_callback (callable): Optional, called as progress_callback(phase,
+                                      pages_done, total_pages) while pages are stamped
+                                      ('stamping') and once the summary pages and the
+                                      save start ('saving'), see ProgressReporter.
+        progress_interval (float): Seconds between two progress calls.
+    """
+    if mode not in STAMP_MODES:
+        raise ValueError(f"Unknown stamping mode '{mode}', expected one of {STAMP_MODES}")
+    if save_profile not in SAVE_PROFILES:
+        raise ValueError(f"Unknown save profile '{save_profile}', expected one of {tuple(SAVE_PROFILES)}")
+    with activate(report) as report, report.stage('stamping_total'):
+        return stamp_pages_and_summaries(input_pdf_path, sku_locations, output_pdf_path, report,
+                                         mode == STAMP_MODE_IN_PLACE, pages, SAVE_PROFILES[save_profile],
+                                         ProgressReporter(progress_callback, progress_interval))
+
+class PageStamper:
+    """
+    Stamps waybill pages in page order and finishes the output with the summary
+    pages. stamp_skus_on_pdf() stamps all pages after extraction has finished;
+    extract_and_stamp_pdf() stamps each page as soon as extraction has passed it.
 
-                    output_page.draw_rect(background_rect, color=(0.8, 0.8, 0.8), fill=(0.8, 0.8, 0.8))
+    Stamping errors are printed and stop further stamping; finish() then reports
+    failure, so an extraction feeding the stamper can still run to the end.
+    """
+    FONT_NAME = "helv"
+    FONT_SIZE = 12
+    MIN_FONT_SIZE = 8
+
+    def __init__(self, input_pdf_path, in_place, report, progress=None):
+        self.input_pdf_path = input_pdf_path
+        self.in_place = in_place
+        self.report = report
+        self.progress = progress if progress is not None else ProgressReporter()
+        self.measurer = get_text_measurer(self.FONT_NAME)
+        self.doc = None
+        self.output_doc = None
+        self.total_pages = 0
+        self.batch_size = 1
+        self.next_page = 0
+        self.failed = False
+
+    def open(self):
+        """
+        Opens the input PDF (and the output PDF in copy mode).
+
+        Returns:
+            bool: True if stamping can start.
+        """
+        open_timer = self.report.timer('stamp_open')
+        try:
+            self.doc = safe_pdf_operation(fitz.open, 3, self.input_pdf_path)
+            if self.doc is None:
+                print(f"Failed to open input PDF after multiple attempts: {self.input_pdf_path}")
+                return False
 
-                    text_insert_x = rect_x0 + padding_x
-                    text_insert_y = rect_y0 + padding_y + font_size
+            self.output_doc = self.doc if self.in_place else safe_pdf_operation(fitz.open, 3)
+            if self.output_doc is None:
+                print("Failed to create output PDF after multiple attempts")
+                return False
+        except Exception as e:
+            print(f"An error occurred during PDF stamping: {e}")
+            return False
+        finally:
+            open_timer.stop()
 
-                    output_page.insert_text(
-                        fitz.Point(text_insert_x, text_insert_y),
-                        final_text_to_stamp,
-                        fontname=font_name,
-                        fontsize=font_size,
-                        color=(0, 0, 0),
-                        set_simple=True
-                    )
+        # Memory optimization: Process pages in batches
+        self.total_pages = self.doc.page_count
+        self.batch_size = 10 if self.total_pages > 50 else max(self.total_pages, 1)
+        if self.total_pages > 100:
+            self.batch_size = 5
+        print(f"Stamping PDFs in batches of {self.batch_size} pages for memory optimization...")
+        return True
 
-                # Free memory after processing each page
-                page = None
+    def stamp_pages_until(self, end_page, page_totals):
+        """
+        Stamps the pages from the first page not stamped yet up to (excluding) end_page.
+
+        Args:
+            end_page (int): Page number to stop at.
+            page_totals (dict): Page number -> {SKU: quantity} for the pages to stamp;
+                                pages missing from it get no stamp.
+        """
+        end_page = min(end_page, self.total_pages)
+        while not self.failed and self.next_page < end_page:
+            page_num = self.next_page
+            if page_num % self.batch_size == 0:
+                print(f"Processing PDF pages {page_num + 1}-{min(page_num + self.batch_size, self.total_pages)}...")
+            try:
+                self.stamp_page(page_num, page_totals.get(page_num, {}))
+            except Exception as e:
+                print(f"An error occurred during PDF stamping: {e}")
+                self.failed = True
+            self.next_page += 1
+            self.progress.advance(self.next_page)
 
             # Force garbage collection after each batch
-            import gc
-            gc.collect()
+            if self.next_page % self.batch_size == 0 or self.next_page == self.total_pages:
+                gc.collect()
+
+    def stamp_page(self, page_num, sku_totals):
+        report = self.report
+        doc = self.doc
+        page = safe_pdf_operation(doc.load_page, 3, page_num)
+        if page is None:
+            print(f"Failed to load page {page_num + 1} for stamping after multiple attempts, skipping...")
+            return
+
+        if self.in_place:
+            # Stamp on top of the page itself; restore any graphics state the
+            # page content leaves changed so it cannot distort the stamp
+            output_page = page
+            with report.stage('page_prepare'):
+                if not output_page.is_wrapped:
+                    output_page.wrap_contents()
+        else:
+            output_page = safe_pdf_operation(self.output_doc.new_page, 3,
+                width=page.rect.width, height=page.rect.height)
+            if output_page is None:
+                print(f"Failed to create output page {page_num + 1} after multiple attempts, skipping...")
+                return
+
+            # Use safe operation for showing PDF page
+            try:
+                with report.stage('page_copy'):
+                    safe_pdf_operation(output_page.show_pdf_page, 3, page.rect, doc, page_num)
+            except Exception as e:
+                print(f"Failed to copy page {page_num + 1} content after multiple attempts: {e}")
+                return
+
+        render_timer = report.timer('stamp_render')
+        measurer = self.measurer
+        font_size = self.FONT_SIZE
+        bottom_margin = 20
+        left_margin = 20
+
+        final_skus_to_stamp_on_this_page = sorted(format_sku_quantity(sku, total_qty)
+                                                  for sku, total_qty in sku_totals.items())
+
+        if final_skus_to_stamp_on_this_page:
+            lines = final_skus_to_stamp_on_this_page
+
+            max_line_width = 0
+            num_lines = 0
+
+            try:
+                max_line_width = max(measurer.text_length(line, font_size) for line in lines)
+                num_lines = len(lines)
+            except Exception as e:
+                print(f"Warning: Error calculating text dimensions: {e}. Using default size for background.")
+                max_line_width = 100
+                num_lines = 1
+
+            padding_x = 10
+            padding_y = 5
+
+            background_width = max_line_width + (2 * padding_x)
+            background_height = (num_lines * font_size * 1.4) + (2 * padding_y)
+
+            rect_x0 = left_margin
+            rect_x1 = rect_x0 + background_width
+
+            rect_y1 = output_page.rect.height - bottom_margin
+            rect_y0 = rect_y1 - background_height
+
+            background_rect = fitz.Rect(rect_x0, rect_y0, rect_x1, rect_y1)
+
+            # Shapes and text each go into the page with a single write
+            shape = output_page.new_shape()
+            shape.draw_rect(background_rect)
+            shape.finish(color=(0.8, 0.8, 0.8), fill=(0.8, 0.8, 0.8))
+            shape.commit()
+
+            text_insert_x = rect_x0 + padding_x
+            text_insert_y = rect_y0 + padding_y + font_size
+            line_spacing = measurer.line_spacing(font_size)
+
+            text_writer = fitz.TextWriter(output_page.rect)
+            for line_index, line in enumerate(lines):
+                text_writer.append(fitz.Point(text_insert_x, text_insert_y + line_index * line_spacing), line,
+                                   font=measurer.font, fontsize=font_size)
+            text_writer.write_text(output_page, color=(0, 0, 0))
+        render_timer.stop()
+        report.count('pages_stamped')
+
+    def finish(self, aggregation, output_pdf_path, save_options):
+        """
+        Stamps any pages left, appends the summary pages and saves the output.
+
+        Args:
+            aggregation (SkuAggregation): Statistics of the whole document.
+            output_pdf_path (str): Where to save the stamped PDF.
+            save_options (dict): Options for doc.save(), see SAVE_PROFILES.
+
+        Returns:
+            bool: True if every page was stamped and the output was saved.
+        """
+        try:
+            self.progress.start(PHASE_STAMPING, self.total_pages, self.next_page)
+            self.stamp_pages_until(self.total_pages, aggregation.page_totals)
+            if self.failed:
+                return False
+            self.progress.start(PHASE_SAVING, self.total_pages, self.next_page)
+            self.append_summary_pages(aggregation)
+
+            # Use safe save function for PythonAnywhere compatibility
+            with self.report.stage('save'):
+                save_success = safe_file_save(self.output_doc, output_pdf_path, save_options=save_options)
+            if not save_success:
+                print(f"Failed to save PDF to: {output_pdf_path}")
+                return False
+
+            self.report.count('input_bytes', os.path.getsize(self.input_pdf_path))
+            self.report.count('output_bytes', os.path.getsize(output_pdf_path))
+            return True
+        except Exception as e:
+            print(f"An error occurred during PDF stamping: {e}")
+            return False
+        finally:
+            self.close()
+
+    def append_summary_pages(self, aggregation):
+        doc = self.doc
+        output_doc = self.output_doc
+        font_size = self.FONT_SIZE
 
+        summary_timer = self.report.timer('summary_layout')
         first_page = safe_pdf_operation(doc.load_page, 3, 0)
         if first_page is None:
             print("Failed to load first page for dimensions, using default values")
@@ -526,742 +1045,199 @@ def stamp_skus_on_pdf(input_pdf_path, sku_locations, output_pdf_path, multi_sku_
             page_width = first_page_dims.width
             page_height = first_page_dims.height
             first_page = None  # Free memory
-        summary_padding_x = 10
-        summary_padding_y = 10
-        top_margin_summary = 20
-        available_content_height_per_page = page_height - (2 * bottom_margin) - (2 * summary_padding_y)
-
-        def add_new_summary_page_content(page_obj, lines_to_stamp, title="", dynamic_font_sizing_enabled=False, position_top=False):
-            content_elements_info = []
-            max_content_width_on_page = 0
-
-            max_width_for_text_area = page_width - (2 * left_margin) - (2 * summary_padding_x)
-
-            if title:
-                title_font_size_actual = font_size
-                title_text_width = fitz.get_text_length(title, fontname=font_name, fontsize=title_font_size_actual)
-                while title_text_width > max_width_for_text_area and title_font_size_actual > MIN_FONT_SIZE:
-                    title_font_size_actual -= 0.5
-                    title_text_width = fitz.get_text_length(title, fontname=font_name, fontsize=title_font_size_actual)
-
-                content_elements_info.append((title, title_font_size_actual, title_font_size_actual * 1.8))
-                max_content_width_on_page = max(max_content_width_on_page, title_text_width)
-
-            for line in lines_to_stamp:
-                current_line_font_size = font_size
-
-                # Check if line needs to be split due to width
-                text_width = fitz.get_text_length(line, fontname=font_name, fontsize=current_line_font_size)
-
-                # Add extra width for bullet points if this line has a bullet
-                if line.startswith("● "):
-                    bullet_space = 15  # Space for bullet circle (3 radius + 2 margin + 6 spacing)
-                    text_width += bullet_space
-
-                if text_width > max_width_for_text_area:
-                    # Split long lines by breaking at " / " separators or spaces
-                    if " / " in line:
-                        # Split at SKU separators first
-                        parts = line.split(" / ")
-                        current_line_parts = []
-
-                        for part in parts:
-                            test_line = " / ".join(current_line_parts + [part])
-                            test_width = fitz.get_text_length(test_line, fontname=font_name, fontsize=current_line_font_size)
-
-                            if test_width <= max_width_for_text_area:
-                                current_line_parts.append(part)
-                            else:
-                                # Add current accumulated parts as a line
-                                if current_line_parts:
-                                    accumulated_line = " / ".join(current_line_parts)
-                                    accumulated_width = fitz.get_text_length(accumulated_line, fontname=font_name, fontsize=current_line_font_size)
-                                    if line.startswith("● "):
-                                        accumulated_width += 15  # Add bullet space
-                                    content_elements_info.append((accumulated_line, current_line_font_size, current_line_font_size * 1.4))
-                                    max_content_width_on_page = max(max_content_width_on_page, accumulated_width)
-
-                                # Start new line with current part
-                                current_line_parts = [part]
-
-                        # Add remaining parts
-                        if current_line_parts:
-                            final_line = " / ".join(current_line_parts)
-                            final_width = fitz.get_text_length(final_line, fontname=font_name, fontsize=current_line_font_size)
-                            if line.startswith("● "):
-                                final_width += 15  # Add bullet space
-                            content_elements_info.append((final_line, current_line_font_size, current_line_font_size * 1.4))
-                            max_content_width_on_page = max(max_content_width_on_page, final_width)
-                    else:
-                        # Split at spaces for non-pattern lines
-                        words = line.split()
-                        current_line_words = []
-
-                        for word in words:
-                            test_line = " ".join(current_line_words + [word])
-                            test_width = fitz.get_text_length(test_line, fontname=font_name, fontsize=current_line_font_size)
-
-                            if test_width <= max_width_for_text_area:
-                                current_line_words.append(word)
-                            else:
-                                # Add current accumulated words as a line
-                                if current_line_words:
-                                    accumulated_line = " ".join(current_line_words)
-                                    accumulated_width = fitz.get_text_length(accumulated_line, fontname=font_name, fontsize=current_line_font_size)
-                                    if line.startswith("● "):
-                                        accumulated_width += 15  # Add bullet space
-                                    content_elements_info.append((accumulated_line, current_line_font_size, current_line_font_size * 1.4))
-                                    max_content_width_on_page = max(max_content_width_on_page, accumulated_width)
-
-                                # Start new line with current word
-                                current_line_words = [word]
-
-                        # Add remaining words
-                        if current_line_words:
-                            final_line = " ".join(current_line_words)
-                            final_width = fitz.get_text_length(final_line, fontname=font_name, fontsize=current_line_font_size)
-                            if line.startswith("● "):
-                                final_width += 15  # Add bullet space
-                            content_elements_info.append((final_line, current_line_font_size, current_line_font_size * 1.4))
-                            max_content_width_on_page = max(max_content_width_on_page, final_width)
-                else:
-                    # Line fits, add as-is
-                    final_text_width = text_width
-                    if line.startswith("● "):
-                        final_text_width += 15  # Add bullet space for display width calculation
-                    content_elements_info.append((line, current_line_font_size, current_line_font_size * 1.4))
-                    max_content_width_on_page = max(max_content_width_on_page, final_text_width)
 
-            total_content_height_on_page = sum(info[2] for info in content_elements_info) + (2 * summary_padding_y)
+        # Summary sections, in page order
+        summary_sections = []
+        if aggregation.global_totals:
+            summary_sections.append(summary_section(
+                "--- All SKUs Summary ---",
+                [format_sku_quantity(sku, total_qty) for sku, total_qty in sorted(aggregation.global_totals.items())],
+                columns=2, continued_title="--- All SKUs Summary (continued) ---"))
+
+        # Multi-SKU Orders Pattern Summary, ordered by pattern text
+        if aggregation.mixed_order_patterns:
+            pattern_counts = sorted((format_pattern(pattern), count)
+                                    for pattern, count in aggregation.mixed_order_patterns.items())
+            summary_sections.append(summary_section(
+                "--- Mix Orders Patterns ---",
+                [f"{pattern} - {count} orders" if count > 1 else f"{pattern} - 1 order"
+                 for pattern, count in pattern_counts]))
+
+        # Multi-SKU Orders SKU Count Summary
+        if aggregation.mixed_order_sku_totals:
+            summary_sections.append(summary_section(
+                "--- Mix Orders SKU Count ---",
+                [format_sku_quantity(sku, total_qty)
+                 for sku, total_qty in sorted(aggregation.mixed_order_sku_totals.items())],
+                columns=2, continued_title="--- Mix Orders SKU Count (continued) ---"))
+
+        # Wrap and paginate all sections at once, then draw the pages
+        summary_layout = SummaryLayout(self.measurer, page_width, page_height, font_size=font_size,
+                                       min_font_size=self.MIN_FONT_SIZE)
+        for page_layout in summary_layout.paginate(summary_sections):
+            new_page = output_doc.new_page(width=page_width, height=page_height)
+            summary_layout.render(new_page, page_layout)
+
+        summary_timer.stop()
+        self.report.count('output_pages', output_doc.page_count)
+
+    def close(self):
+        if self.output_doc is not None and self.output_doc is not self.doc:
+            self.output_doc.close()
+        if self.doc is not None:
+            self.doc.close()
+        self.doc = self.output_doc = None
+
+def stamp_pages_and_summaries(input_pdf_path, sku_locations, output_pdf_path, report, in_place, pages, save_options,
+                              progress):
+    stamper = PageStamper(input_pdf_path, in_place, report, progress)
+    if not stamper.open():
+        stamper.close()
+        return False
+
+    # Two-page orders come from the extraction, the page text is not read again
+    if pages is not None:
+        order_continuations = continuation_pages(pages)
+    else:
+        order_continuations = continuation_pages_from_skus(sku_locations)
+    with report.stage('aggregation'):
+        aggregation = aggregate_skus(sku_locations, order_continuations)
 
-            bg_rect_x0 = left_margin
-            bg_rect_x1 = left_margin + max_content_width_on_page + (2 * summary_padding_x)
+    return stamper.finish(aggregation, output_pdf_path, save_options)
 
-            if position_top:
-                bg_rect_y0 = top_margin_summary
-                bg_rect_y1 = top_margin_summary + total_content_height_on_page
-            else:
-                bg_rect_y1 = page_height - bottom_margin
-                bg_rect_y0 = bg_rect_y1 - total_content_height_on_page
-
-            background_rect = fitz.Rect(bg_rect_x0, bg_rect_y0, bg_rect_x1, bg_rect_y1)
-
-            page_obj.draw_rect(background_rect, color=(0.9, 0.9, 0.9), fill=(0.9, 0.9, 0.9))
-
-            if position_top:
-                current_y_cursor = top_margin_summary + summary_padding_y
-                if content_elements_info:
-                    current_y_cursor += content_elements_info[0][1]
-
-                for text_content, font_size_actual, element_height_taken in content_elements_info:
-                    if text_content != title or not title:
-                        # Check if this line should have a bullet (starts with "● ")
-                        if text_content.startswith("● "):
-                            # Draw a circle bullet
-                            bullet_radius = 3
-                            bullet_x = left_margin + summary_padding_x + bullet_radius + 2
-                            bullet_y = current_y_cursor - (font_size_actual * 0.3)
-                            bullet_center = fitz.Point(bullet_x, bullet_y)
-                            page_obj.draw_circle(bullet_center, bullet_radius, color=(0, 0, 0), fill=(0, 0, 0))
-
-                            # Insert text without the bullet symbol, with proper spacing
-                            text_without_bullet = text_content[2:]  # Remove "● "
-                            text_x = bullet_x + bullet_radius + 6
-                            page_obj.insert_text(
-                                fitz.Point(text_x, current_y_cursor),
-                                text_without_bullet,
-                                fontname=font_name,
-                                fontsize=font_size_actual,
-                                color=(0, 0, 0),
-                                set_simple=True
-                            )
-                        else:
-                            page_obj.insert_text(
-                                fitz.Point(left_margin + summary_padding_x, current_y_cursor),
-                                text_content,
-                                fontname=font_name,
-                                fontsize=font_size_actual,
-                                color=(0, 0, 0),
-                                set_simple=True
-                            )
-                        current_y_cursor += element_height_taken
-                    else:
-                         page_obj.insert_text(
-                            fitz.Point(left_margin + summary_padding_x, current_y_cursor),
-                            text_content,
-                            fontname=font_name,
-                            fontsize=font_size_actual,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                         current_y_cursor += element_height_taken
-            else:
-                current_y_cursor = bg_rect_y0 + summary_padding_y + (content_elements_info[0][1] if content_elements_info else 0)
-                for text_content, font_size_actual, element_height_taken in content_elements_info:
-                    # Check if this line should have a bullet (starts with "● ")
-                    if text_content.startswith("● "):
-                        # Draw a circle bullet
-                        bullet_radius = 3
-                        bullet_x = left_margin + summary_padding_x + bullet_radius + 2
-                        bullet_y = current_y_cursor - (font_size_actual * 0.3)
-                        bullet_center = fitz.Point(bullet_x, bullet_y)
-                        page_obj.draw_circle(bullet_center, bullet_radius, color=(0, 0, 0), fill=(0, 0, 0))
-
-                        # Insert text without the bullet symbol, with proper spacing
-                        text_without_bullet = text_content[2:]  # Remove "● "
-                        text_x = bullet_x + bullet_radius + 6
-                        page_obj.insert_text(
-                            fitz.Point(text_x, current_y_cursor),
-                            text_without_bullet,
-                            fontname=font_name,
-                            fontsize=font_size_actual,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                    else:
-                        page_obj.insert_text(
-                            fitz.Point(left_margin + summary_padding_x, current_y_cursor),
-                            text_content,
-                            fontname=font_name,
-                            fontsize=font_size_actual,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                    current_y_cursor -= element_height_taken
-
-        if global_aggregated_skus:
-            summary_text_lines = []
-            sorted_global_skus = sorted(global_aggregated_skus.items())
-            for sku, total_qty in sorted_global_skus:
-                summary_text_lines.append(f"● {sku} (x{total_qty})")
-
-            # Create a special 2-column layout for All SKUs Summary page
-            def add_two_column_all_skus_page(page_obj, lines_to_display, title=""):
-                # Calculate column dimensions
-                available_width = page_width - (2 * left_margin) - (2 * summary_padding_x)
-                column_width = (available_width - 20) / 2  # 20 points spacing between columns
-
-                # Split lines into two columns
-                mid_point = len(lines_to_display) // 2
-                if len(lines_to_display) % 2 != 0:
-                    mid_point += 1  # Put extra item in first column
-
-                left_column_lines = lines_to_display[:mid_point]
-                right_column_lines = lines_to_display[mid_point:]
-
-                # Calculate title dimensions
-                title_height = 0
-                if title:
-                    title_font_size_actual = font_size
-                    title_text_width = fitz.get_text_length(title, fontname=font_name, fontsize=title_font_size_actual)
-                    while title_text_width > available_width and title_font_size_actual > MIN_FONT_SIZE:
-                        title_font_size_actual -= 0.5
-                        title_text_width = fitz.get_text_length(title, fontname=font_name, fontsize=title_font_size_actual)
-                    title_height = title_font_size_actual * 1.8
-
-                # Calculate content height for background
-                max_column_height = max(len(left_column_lines), len(right_column_lines)) * (font_size * 1.4)
-                total_content_height = title_height + max_column_height + (2 * summary_padding_y)
-
-                # Draw background
-                bg_rect_x0 = left_margin
-                bg_rect_x1 = left_margin + available_width + (2 * summary_padding_x)
-                bg_rect_y0 = top_margin_summary
-                bg_rect_y1 = top_margin_summary + total_content_height
-
-                background_rect = fitz.Rect(bg_rect_x0, bg_rect_y0, bg_rect_x1, bg_rect_y1)
-                page_obj.draw_rect(background_rect, color=(0.9, 0.9, 0.9), fill=(0.9, 0.9, 0.9))
-
-                # Draw title
-                current_y = top_margin_summary + summary_padding_y
-                if title:
-                    current_y += title_font_size_actual
-                    page_obj.insert_text(
-                        fitz.Point(left_margin + summary_padding_x, current_y),
-                        title,
-                        fontname=font_name,
-                        fontsize=title_font_size_actual,
-                        color=(0, 0, 0),
-                        set_simple=True
-                    )
-                    current_y += title_font_size_actual * 0.8  # Add some spacing after title
-
-                # Draw left column
-                left_column_x = left_margin + summary_padding_x
-                current_left_y = current_y + font_size
-
-                for line in left_column_lines:
-                    if line.startswith("● "):
-                        # Draw bullet
-                        bullet_radius = 3
-                        bullet_x = left_column_x + bullet_radius + 2
-                        bullet_y = current_left_y - (font_size * 0.3)
-                        bullet_center = fitz.Point(bullet_x, bullet_y)
-                        page_obj.draw_circle(bullet_center, bullet_radius, color=(0, 0, 0), fill=(0, 0, 0))
-
-                        # Draw text
-                        text_without_bullet = line[2:]  # Remove "● "
-                        text_x = bullet_x + bullet_radius + 6
-                        page_obj.insert_text(
-                            fitz.Point(text_x, current_left_y),
-                            text_without_bullet,
-                            fontname=font_name,
-                            fontsize=font_size,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                    else:
-                        page_obj.insert_text(
-                            fitz.Point(left_column_x, current_left_y),
-                            line,
-                            fontname=font_name,
-                            fontsize=font_size,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                    current_left_y += font_size * 1.4
-
-                # Draw right column
-                right_column_x = left_column_x + column_width + 20  # 20 points spacing
-                current_right_y = current_y + font_size
-
-                for line in right_column_lines:
-                    if line.startswith("● "):
-                        # Draw bullet
-                        bullet_radius = 3
-                        bullet_x = right_column_x + bullet_radius + 2
-                        bullet_y = current_right_y - (font_size * 0.3)
-                        bullet_center = fitz.Point(bullet_x, bullet_y)
-                        page_obj.draw_circle(bullet_center, bullet_radius, color=(0, 0, 0), fill=(0, 0, 0))
-
-                        # Draw text
-                        text_without_bullet = line[2:]  # Remove "● "
-                        text_x = bullet_x + bullet_radius + 6
-                        page_obj.insert_text(
-                            fitz.Point(text_x, current_right_y),
-                            text_without_bullet,
-                            fontname=font_name,
-                            fontsize=font_size,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                    else:
-                        page_obj.insert_text(
-                            fitz.Point(right_column_x, current_right_y),
-                            line,
-                            fontname=font_name,
-                            fontsize=font_size,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                    current_right_y += font_size * 1.4
-
-            # Check if all lines fit in one page with 2-column layout
-            max_lines_per_page = int(available_content_height_per_page / (font_size * 1.4))
-            max_lines_two_columns = max_lines_per_page * 2  # Since we have 2 columns
-
-            if len(summary_text_lines) <= max_lines_two_columns:
-                # All lines fit in one page with 2 columns
-                new_page = output_doc.new_page(width=page_width, height=page_height)
-                add_two_column_all_skus_page(new_page, summary_text_lines, "--- All SKUs Summary ---")
-            else:
-                # Need multiple pages - use 2-column for first page, then regular layout for overflow
-                current_summary_lines_buffer = []
-                current_buffer_height = 0
-                page_count = 0
-
-                estimated_line_height_fixed = font_size * 1.4
-
-                for line in summary_text_lines:
-                    if current_buffer_height + estimated_line_height_fixed > available_content_height_per_page:
-                        new_page = output_doc.new_page(width=page_width, height=page_height)
-                        if page_count == 0:
-                            # First page uses 2-column layout
-                            add_two_column_all_skus_page(new_page, current_summary_lines_buffer, "--- All SKUs Summary ---")
-                        else:
-                            # Subsequent pages use regular layout
-                            add_new_summary_page_content(new_page, current_summary_lines_buffer, "--- All SKUs Summary (continued) ---", position_top=True)
-                        current_summary_lines_buffer = [line]
-                        current_buffer_height = estimated_line_height_fixed
-                        page_count += 1
-                    else:
-                        current_summary_lines_buffer.append(line)
-                        current_buffer_height += estimated_line_height_fixed
-
-                if current_summary_lines_buffer:
-                    new_page = output_doc.new_page(width=page_width, height=page_height)
-                    if page_count == 0:
-                        # Only page uses 2-column layout
-                        add_two_column_all_skus_page(new_page, current_summary_lines_buffer, "--- All SKUs Summary ---")
-                    else:
-                        # Final page uses regular layout
-                        add_new_summary_page_content(new_page, current_summary_lines_buffer, "--- All SKUs Summary (continued) ---", position_top=True)
-
-        # Multi-SKU Orders Pattern Summary
-        multi_sku_pattern_counts = {}
-
-        # Track which pages we've already processed to avoid double-counting two-page orders
-        processed_pages = set()
-
-        # Group SKUs by page and check for multi-SKU pages, handling two-page orders
-        for page_num in range(doc.page_count):
-            if page_num in processed_pages:
-                continue
+def extract_and_stamp_pdf(pdf_path, output_pdf_path, workers=1, cache_path=None, roi=None, report=None,
+                          mode=STAMP_MODE_IN_PLACE, save_profile=DEFAULT_SAVE_PROFILE, progress_callback=None,
+                          progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """
+    Extracts the SKUs of a PDF and stamps them in one pass: each page is stamped
+    as soon as extraction has passed it, so stamping overlaps with extraction
+    (with workers > 1, extraction runs in other processes meanwhile), and only the
+    summary pages wait for the whole document.
 
-            if page_num in skus_by_page:
-                # Start with SKUs from current page
-                combined_sku_aggregated = {}
-                for sku_info in skus_by_page[page_num]:
-                    sku_text = sku_info['sku']
-                    sku_quantity = sku_info['quantity']
-                    if sku_text in combined_sku_aggregated:
-                        combined_sku_aggregated[sku_text] += sku_quantity
-                    else:
-                        combined_sku_aggregated[sku_text] = sku_quantity
-
-                # Check if this is a two-page order by looking at the next page
-                is_two_page_order = False
-                if page_num + 1 < doc.page_count:
-                    current_page = safe_pdf_operation(doc.load_page, 3, page_num)
-                    next_page = safe_pdf_operation(doc.load_page, 3, page_num + 1)
-
-                    if current_page is not None and next_page is not None:
-                        current_page_text = safe_pdf_operation(current_page.get_text, 3)
-                        next_page_text = safe_pdf_operation(next_page.get_text, 3)
-
-                        # Check if current page has "Weight:" and next page doesn't
-                        if (current_page_text is not None and next_page_text is not None and
-                            "Weight:" in current_page_text and "Weight:" not in next_page_text):
-                            is_two_page_order = True
-
-                            # Add SKUs from the next page to the combined aggregation
-                            if page_num + 1 in skus_by_page:
-                                for sku_info in skus_by_page[page_num + 1]:
-                                    sku_text = sku_info['sku']
-                                    sku_quantity = sku_info['quantity']
-                                    if sku_text in combined_sku_aggregated:
-                                        combined_sku_aggregated[sku_text] += sku_quantity
-                                    else:
-                                        combined_sku_aggregated[sku_text] = sku_quantity
-
-                            # Mark next page as processed so we don't count it separately
-                            processed_pages.add(page_num + 1)
-
-                        # Free memory
-                        current_page = None
-                        next_page = None
-
-                # Check if this order (single or two-page) has more than one unique SKU
-                if len(combined_sku_aggregated) > 1:
-                    # Create pattern string for this order
-                    sorted_order_skus = sorted(combined_sku_aggregated.items())
-                    pattern_parts = []
-                    for sku, total_qty in sorted_order_skus:
-                        pattern_parts.append(f"{sku} (x{total_qty})")
-
-                    pattern = " / ".join(pattern_parts)
-
-                    # Count this pattern
-                    if pattern in multi_sku_pattern_counts:
-                        multi_sku_pattern_counts[pattern] += 1
-                    else:
-                        multi_sku_pattern_counts[pattern] = 1
-
-                # Mark current page as processed
-                processed_pages.add(page_num)
-
-        # Create Multi-SKU Orders summary page if there are any patterns
-        if multi_sku_pattern_counts:
-            multi_sku_summary_lines = []
-            sorted_patterns = sorted(multi_sku_pattern_counts.items())
-            for pattern, count in sorted_patterns:
-                if count > 1:
-                    multi_sku_summary_lines.append(f"● {pattern} - {count} orders")
-                else:
-                    multi_sku_summary_lines.append(f"● {pattern} - 1 order")
-
-            # Process lines with proper page break handling for wrapped content
-            current_multi_sku_lines_buffer = []
-            current_buffer_height = 0
-
-            # Define line height for calculations
-            estimated_line_height_fixed = font_size * 1.4
-
-            for line in multi_sku_summary_lines:
-                # Calculate how many lines this entry will actually take after wrapping
-                max_width_for_text_area = page_width - (2 * left_margin) - (2 * summary_padding_x)
-                text_width = fitz.get_text_length(line, fontname=font_name, fontsize=font_size)
-
-                # Estimate number of lines this entry will take
-                estimated_lines_for_this_entry = 1
-                if text_width > max_width_for_text_area:
-                    if " / " in line:
-                        # Count SKU parts to estimate wrapped lines
-                        parts = line.split(" / ")
-                        current_test_parts = []
-                        line_count = 0
-
-                        for part in parts:
-                            test_line = " / ".join(current_test_parts + [part])
-                            test_width = fitz.get_text_length(test_line, fontname=font_name, fontsize=font_size)
-
-                            if test_width <= max_width_for_text_area:
-                                current_test_parts.append(part)
-                            else:
-                                if current_test_parts:
-                                    line_count += 1
-                                current_test_parts = [part]
-
-                        if current_test_parts:
-                            line_count += 1
-
-                        estimated_lines_for_this_entry = max(1, line_count)
-                    else:
-                        # Estimate based on character count for word wrapping
-                        estimated_lines_for_this_entry = max(1, int(text_width / max_width_for_text_area) + 1)
-
-                estimated_height_for_this_entry = estimated_lines_for_this_entry * estimated_line_height_fixed
-
-                # Check if adding this entry would exceed page height
-                if current_buffer_height + estimated_height_for_this_entry > available_content_height_per_page:
-                    # Create page with current buffer
-                    if current_multi_sku_lines_buffer:
-                        new_page = output_doc.new_page(width=page_width, height=page_height)
-                        add_new_summary_page_content(new_page, current_multi_sku_lines_buffer, "--- Mix Orders Patterns ---", position_top=True)
-
-                    # Start new page with current line
-                    current_multi_sku_lines_buffer = [line]
-                    current_buffer_height = estimated_height_for_this_entry
-                else:
-                    # Add to current buffer
-                    current_multi_sku_lines_buffer.append(line)
-                    current_buffer_height += estimated_height_for_this_entry
+    Args:
+        pdf_path (str): The path to the PDF file.
+        output_pdf_path (str): Where to save the stamped PDF.
+        workers, cache_path, roi: See extract_document().
+        report, mode, save_profile: See stamp_skus_on_pdf().
+        progress_callback (callable): Optional, called as progress_callback(phase,
+                                      pages_done, total_pages). Pages count as done
+                                      in the 'extracting' phase once they are stamped
+                                      too; 'stamping' and 'saving' follow as in
+                                      stamp_skus_on_pdf().
+        progress_interval (float): Seconds between two progress calls.
 
-            # Create final page if there's remaining content
-            if current_multi_sku_lines_buffer:
-                new_page = output_doc.new_page(width=page_width, height=page_height)
-                add_new_summary_page_content(new_page, current_multi_sku_lines_buffer, "--- Mix Orders Patterns ---", position_top=True)
+    Returns:
+        tuple: (ExtractionResult, bool). The result is None if the file cannot be
+               opened or processed. The flag is True if the stamped PDF was saved;
+               nothing is saved when no SKUs were found.
+    """
+    if mode not in STAMP_MODES:
+        raise ValueError(f"Unknown stamping mode '{mode}', expected one of {STAMP_MODES}")
+    if save_profile not in SAVE_PROFILES:
+        raise ValueError(f"Unknown save profile '{save_profile}', expected one of {tuple(SAVE_PROFILES)}")
+
+    with activate(report) as report, report.stage('pipeline_total'):
+        result = ExtractionResult(pdf_path)
+        # Extraction reports the progress of the interleaved page stamping
+        progress = ProgressReporter(progress_callback, progress_interval)
+        stamper = PageStamper(pdf_path, mode == STAMP_MODE_IN_PLACE, report)
+        try:
+            stamping = stamper.open()
+            for page_batch in iter_sku_locations(pdf_path, workers=workers, cache_path=cache_path, roi=roi,
+                                                 progress=progress):
+                result.add_page(page_batch)
+                if stamping:
+                    page_totals = Counter()
+                    for sku_info in page_batch['skus']:
+                        page_totals[sku_info['sku']] += sku_info['quantity']
+                    stamper.stamp_pages_until(page_batch['page_num'] + 1, {page_batch['page_num']: page_totals})
+        except FileNotFoundError:
+            stamper.close()
+            print(f"Error: The file '{pdf_path}' was not found.")
+            return None, False
+        except Exception as e:
+            stamper.close()
+            print(f"An error occurred while reading the PDF: {e}")
+            return None, False
 
-        # Multi-SKU Orders SKU Count Summary
-        if multi_sku_pattern_counts:
-            # Aggregate SKU counts from all multi-SKU patterns
-            multi_sku_count_aggregated = {}
-
-            for pattern, occurrence_count in multi_sku_pattern_counts.items():
-                # Parse the pattern to extract individual SKUs and their quantities
-                # Pattern format: "BWL (x1) / BWM (x1) - 44 orders"
-                # Remove the order count part first
-                pattern_without_count = pattern.split(" - ")[0] if " - " in pattern else pattern
-
-                # Split by " / " to get individual SKU parts
-                sku_parts = pattern_without_count.split(" / ")
-
-                for sku_part in sku_parts:
-                    # Extract SKU name and quantity from format "BWL (x1)"
-                    if " (x" in sku_part and sku_part.endswith(")"):
-                        sku_name = sku_part.split(" (x")[0].strip()
-                        quantity_str = sku_part.split(" (x")[1].rstrip(")")
-                        try:
-                            sku_quantity = int(quantity_str)
-                            # Multiply by the number of times this pattern occurred
-                            total_sku_quantity = sku_quantity * occurrence_count
-
-                            if sku_name in multi_sku_count_aggregated:
-                                multi_sku_count_aggregated[sku_name] += total_sku_quantity
-                            else:
-                                multi_sku_count_aggregated[sku_name] = total_sku_quantity
-                        except ValueError:
-                            continue  # Skip if quantity parsing fails
-
-            # Create Multi-SKU Orders SKU Count summary page if there are any counts
-            if multi_sku_count_aggregated:
-                multi_sku_count_lines = []
-                sorted_multi_sku_counts = sorted(multi_sku_count_aggregated.items())
-                for sku, total_qty in sorted_multi_sku_counts:
-                    multi_sku_count_lines.append(f"● {sku} (x{total_qty})")
-
-                # Create a special 2-column layout for SKU count page
-                def add_two_column_summary_page(page_obj, lines_to_display, title=""):
-                    # Calculate column dimensions
-                    available_width = page_width - (2 * left_margin) - (2 * summary_padding_x)
-                    column_width = (available_width - 20) / 2  # 20 points spacing between columns
-
-                    # Split lines into two columns
-                    mid_point = len(lines_to_display) // 2
-                    if len(lines_to_display) % 2 != 0:
-                        mid_point += 1  # Put extra item in first column
-
-                    left_column_lines = lines_to_display[:mid_point]
-                    right_column_lines = lines_to_display[mid_point:]
-
-                    # Calculate title dimensions
-                    title_height = 0
-                    if title:
-                        title_font_size_actual = font_size
-                        title_text_width = fitz.get_text_length(title, fontname=font_name, fontsize=title_font_size_actual)
-                        while title_text_width > available_width and title_font_size_actual > MIN_FONT_SIZE:
-                            title_font_size_actual -= 0.5
-                            title_text_width = fitz.get_text_length(title, fontname=font_name, fontsize=title_font_size_actual)
-                        title_height = title_font_size_actual * 1.8
-
-                    # Calculate content height for background
-                    max_column_height = max(len(left_column_lines), len(right_column_lines)) * (font_size * 1.4)
-                    total_content_height = title_height + max_column_height + (2 * summary_padding_y)
-
-                    # Draw background
-                    bg_rect_x0 = left_margin
-                    bg_rect_x1 = left_margin + available_width + (2 * summary_padding_x)
-                    bg_rect_y0 = top_margin_summary
-                    bg_rect_y1 = top_margin_summary + total_content_height
-
-                    background_rect = fitz.Rect(bg_rect_x0, bg_rect_y0, bg_rect_x1, bg_rect_y1)
-                    page_obj.draw_rect(background_rect, color=(0.9, 0.9, 0.9), fill=(0.9, 0.9, 0.9))
-
-                    # Draw title
-                    current_y = top_margin_summary + summary_padding_y
-                    if title:
-                        current_y += title_font_size_actual
-                        page_obj.insert_text(
-                            fitz.Point(left_margin + summary_padding_x, current_y),
-                            title,
-                            fontname=font_name,
-                            fontsize=title_font_size_actual,
-                            color=(0, 0, 0),
-                            set_simple=True
-                        )
-                        current_y += title_font_size_actual * 0.8  # Add some spacing after title
-
-                    # Draw left column
-                    left_column_x = left_margin + summary_padding_x
-                    current_left_y = current_y + font_size
-
-                    for line in left_column_lines:
-                        if line.startswith("● "):
-                            # Draw bullet
-                            bullet_radius = 3
-                            bullet_x = left_column_x + bullet_radius + 2
-                            bullet_y = current_left_y - (font_size * 0.3)
-                            bullet_center = fitz.Point(bullet_x, bullet_y)
-                            page_obj.draw_circle(bullet_center, bullet_radius, color=(0, 0, 0), fill=(0, 0, 0))
-
-                            # Draw text
-                            text_without_bullet = line[2:]  # Remove "● "
-                            text_x = bullet_x + bullet_radius + 6
-                            page_obj.insert_text(
-                                fitz.Point(text_x, current_left_y),
-                                text_without_bullet,
-                                fontname=font_name,
-                                fontsize=font_size,
-                                color=(0, 0, 0),
-                                set_simple=True
-                            )
-                        else:
-                            page_obj.insert_text(
-                                fitz.Point(left_column_x, current_left_y),
-                                line,
-                                fontname=font_name,
-                                fontsize=font_size,
-                                color=(0, 0, 0),
-                                set_simple=True
-                            )
-                        current_left_y += font_size * 1.4
-
-                    # Draw right column
-                    right_column_x = left_column_x + column_width + 20  # 20 points spacing
-                    current_right_y = current_y + font_size
-
-                    for line in right_column_lines:
-                        if line.startswith("● "):
-                            # Draw bullet
-                            bullet_radius = 3
-                            bullet_x = right_column_x + bullet_radius + 2
-                            bullet_y = current_right_y - (font_size * 0.3)
-                            bullet_center = fitz.Point(bullet_x, bullet_y)
-                            page_obj.draw_circle(bullet_center, bullet_radius, color=(0, 0, 0), fill=(0, 0, 0))
-
-                            # Draw text
-                            text_without_bullet = line[2:]  # Remove "● "
-                            text_x = bullet_x + bullet_radius + 6
-                            page_obj.insert_text(
-                                fitz.Point(text_x, current_right_y),
-                                text_without_bullet,
-                                fontname=font_name,
-                                fontsize=font_size,
-                                color=(0, 0, 0),
-                                set_simple=True
-                            )
-                        else:
-                            page_obj.insert_text(
-                                fitz.Point(right_column_x, current_right_y),
-                                line,
-                                fontname=font_name,
-                                fontsize=font_size,
-                                color=(0, 0, 0),
-                                set_simple=True
-                            )
-                        current_right_y += font_size * 1.4
-
-                # Check if all lines fit in one page with 2-column layout
-                max_lines_per_page = int(available_content_height_per_page / (font_size * 1.4))
-                max_lines_two_columns = max_lines_per_page * 2  # Since we have 2 columns
-
-                # Define line height for calculations
-                estimated_line_height_fixed = font_size * 1.4
-
-                if len(multi_sku_count_lines) <= max_lines_two_columns:
-                    # All lines fit in one page with 2 columns
-                    new_page = output_doc.new_page(width=page_width, height=page_height)
-                    add_two_column_summary_page(new_page, multi_sku_count_lines, "--- Mix Orders SKU Count ---")
-                else:
-                    # Need multiple pages - use regular single column layout for overflow
-                    current_multi_sku_count_buffer = []
-                    current_buffer_height = 0
-                    page_count = 0
-
-                    for line in multi_sku_count_lines:
-                        if current_buffer_height + estimated_line_height_fixed > available_content_height_per_page:
-                            new_page = output_doc.new_page(width=page_width, height=page_height)
-                            if page_count == 0:
-                                # First page uses 2-column layout
-                                add_two_column_summary_page(new_page, current_multi_sku_count_buffer, "--- Mix Orders SKU Count ---")
-                            else:
-                                # Subsequent pages use regular layout
-                                add_new_summary_page_content(new_page, current_multi_sku_count_buffer, "--- Mix Orders SKU Count (continued) ---", position_top=True)
-                            current_multi_sku_count_buffer = [line]
-                            current_buffer_height = estimated_line_height_fixed
-                            page_count += 1
-                        else:
-                            current_multi_sku_count_buffer.append(line)
-                            current_buffer_height += estimated_line_height_fixed
-
-                    if current_multi_sku_count_buffer:
-                        new_page = output_doc.new_page(width=page_width, height=page_height)
-                        if page_count == 0:
-                            # Only page uses 2-column layout
-                            add_two_column_summary_page(new_page, current_multi_sku_count_buffer, "--- Mix Orders SKU Count ---")
-                        else:
-                            # Final page uses regular layout
-                            add_new_summary_page_content(new_page, current_multi_sku_count_buffer, "--- Mix Orders SKU Count (continued) ---", position_top=True)
-
-
-        # Use safe save function for PythonAnywhere compatibility
-        save_success = safe_file_save(output_doc, output_pdf_path)
-        output_doc.close()
-        doc.close()
+        if not stamping or not result.sku_locations:
+            stamper.close()
+            return result, False
 
-        if not save_success:
-            print(f"Failed to save PDF to: {output_pdf_path}")
+        with report.stage('aggregation'):
+            aggregation = aggregate_skus(result.sku_locations, continuation_pages(result.pages))
+        stamper.progress = progress
+        return result, stamper.finish(aggregation, output_pdf_path, SAVE_PROFILES[save_profile])
+
+def parse_roi(value):
+    """
+    Parses the --roi option: "auto" or four comma-separated coordinates in points.
+    """
+    if value.strip().lower() == "auto":
+        return "auto"
+    try:
+        x0, y0, x1, y1 = (float(v) for v in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected 'auto' or X0,Y0,X1,Y1")
+    return fitz.Rect(x0, y0, x1, y1)
+
+def export_sku_totals(extraction, output_path, export_format, report=None, source=None):
+    """
+    Writes the per-order SKU lines, SKU totals and mixed order patterns of an
+    extraction as JSON or CSV (see sku_export), without stamping or saving a PDF.
+
+    Args:
+        extraction (ExtractionResult): Result of extract_document().
+        output_path (str): File to write.
+        export_format (str): One of EXPORT_FORMATS.
+        report (RunReport): Optional report receiving the aggregation and export timings.
+        source (str): Name of the source PDF recorded in JSON exports (default: the
+                      file name of extraction.pdf_path).
+
+    Returns:
+        bool: True if the export was written.
+    """
+    with activate(report) as report:
+        with report.stage('aggregation'):
+            aggregation = aggregate_skus(extraction.sku_locations, continuation_pages(extraction.pages))
+        try:
+            with report.stage('export'):
+                write_export(aggregation, output_path, export_format,
+                             source=source if source is not None else os.path.basename(extraction.pdf_path))
+        except (IOError, OSError) as e:
+            print(f"Failed to write SKU export to '{output_path}': {e}")
             return False
+    return True
 
-        return True
-    except Exception as e:
-        print(f"An error occurred during PDF stamping: {e}")
-        return False
+def parse_arguments(argv=None):
+    """
+    Parses the command line options of the stamping tool.
+    """
+    parser = argparse.ArgumentParser(description="Waybill SKU Stamping Tool")
+    parser.add_argument("pdf_path", nargs="?",
+                        help="Path to the waybill PDF file (prompted for if omitted)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes used for SKU extraction (default: 1, 0 = all CPU cores)")
+    parser.add_argument("--roi", type=parse_roi, default=None, metavar="auto|X0,Y0,X1,Y1",
+                        help="Only read text inside this region of the page (covering the Order ID, "
+                             "'Weight:' and the SKU table), or learn it with 'auto'. "
+                             "Pages where nothing is found there are read in full.")
+    parser.add_argument("--stamp-mode", choices=STAMP_MODES, default=STAMP_MODE_IN_PLACE,
+                        help="'in-place' draws on the input pages (default); 'copy' copies every page "
+                             "into a new document first")
+    parser.add_argument("--save-profile", choices=tuple(SAVE_PROFILES), default=DEFAULT_SAVE_PROFILE,
+                        help="Output PDF size vs. save time: 'fast', 'balanced' (default) or 'smallest'")
+    parser.add_argument("--extract-only", choices=EXPORT_FORMATS, metavar="json|csv",
+                        help="Skip stamping and only export the per-order SKU lines, SKU totals and "
+                             "mixed order patterns in this format")
+    return parser.parse_args(argv)
 
 def main(file_name=None):
     """
     Main function to run the SKU extraction and stamping process.
     """
+    args = parse_arguments()
+
     print("--- Waybill SKU Stamping Tool with Quantity (End of Page Stamp) ---")
     print("This script will will read a PDF waybill, identify SKU codes and quantities,")
     print("and create a new PDF with the SKUs (and quantities) stamped (black text on light gray background).")
@@ -1284,11 +1260,10 @@ def main(file_name=None):
     print("      Also, ensure you have 'PyMuPDF' installed (`pip install PyMuPDF`).")
     print("      The multi-SKU summary will now correctly consolidate identical multi-SKU order patterns and add a count.")
 
-    pdf_file_path = None
+    pdf_file_path = file_name or args.pdf_path
 
-    if len(sys.argv) > 1:
-            file_name = sys.argv[1]
-            pdf_file_path = file_name.strip()
+    if pdf_file_path:
+        pdf_file_path = pdf_file_path.strip()
     else:
         pdf_file_path = input("\nEnter the full path to your waybill PDF file: ").strip()
 
@@ -1304,51 +1279,58 @@ def main(file_name=None):
     # Get the parent directory (project root)
     project_root = os.path.dirname(script_dir)
     # Create output path in project root
-    output_pdf_path = os.path.join(project_root, f"{base_name}_SKUs_Qty_EndPage.pdf")
-
-    print(f"Output PDF will be saved as: {output_pdf_path}")
+    if args.extract_only:
+        output_path = os.path.join(project_root, f"{base_name}_SKUs.{args.extract_only}")
+        print(f"SKU export will be saved as: {output_path}")
+    else:
+        output_pdf_path = os.path.join(project_root, f"{base_name}_SKUs_Qty_EndPage.pdf")
+        print(f"Output PDF will be saved as: {output_pdf_path}")
 
-    sku_locations = extract_sku_locations_from_pdf(pdf_file_path)
+    report = RunReport()
+    if args.extract_only:
+        extraction = extract_document(pdf_file_path, workers=args.jobs, roi=args.roi, report=report)
+        stamped = False
+    else:
+        # Pages are stamped while the rest of the document is still being extracted
+        print("\nExtracting SKUs and stamping them onto a new PDF...")
+        extraction, stamped = extract_and_stamp_pdf(pdf_file_path, output_pdf_path, workers=args.jobs, roi=args.roi,
+                                                    report=report, mode=args.stamp_mode,
+                                                    save_profile=args.save_profile)
 
-    if sku_locations is None:
+    if extraction is None:
         print("Failed to extract SKU locations from the PDF. Exiting.")
         return
 
+    sku_locations = extraction.sku_locations
     if not sku_locations:
         print("No SKUs were identified in the PDF using the current patterns.")
         return
 
     print(f"\nIdentified {len(sku_locations)} potential SKUs.")
-    print("--- Extracted SKUs per Page (before stamping) ---")
+    print("--- Extracted SKUs per Page ---")
     for sku_info in sku_locations:
         print(f"  Page {sku_info['page_num'] + 1}: SKU='{sku_info['sku']}', Quantity={sku_info['quantity']}, Order ID='{sku_info['order_id']}'")
     print("--------------------------------------------------")
 
-    multi_sku_orders = {}
-    for sku_info in sku_locations:
-        order_id = sku_info.get('order_id', 'UNKNOWN_ORDER')
-        if order_id not in multi_sku_orders:
-            multi_sku_orders[order_id] = []
-        multi_sku_orders[order_id].append(sku_info)
-
-    filtered_multi_sku_orders = {}
-    for order_id, skus_list in multi_sku_orders.items():
-        unique_skus_in_order = set(sku_info['sku'] for sku_info in skus_list)
-        if len(unique_skus_in_order) > 1:
-            filtered_multi_sku_orders[order_id] = skus_list
-
-    print(f"\nStamping them onto a new PDF...")
-
-    if stamp_skus_on_pdf(pdf_file_path, sku_locations, output_pdf_path, filtered_multi_sku_orders):
+    if args.extract_only:
+        print(f"\nExporting SKU totals as {args.extract_only.upper()} (no PDF is rendered)...")
+        if export_sku_totals(extraction, output_path, args.extract_only, report=report):
+            print(f"\nSuccessfully created '{output_path}'.")
+        else:
+            print("\nFailed to write the SKU export.")
+    elif stamped:
         print(f"\nSuccessfully created '{output_pdf_path}' with SKUs and quantities.")
     else:
         print("\nFailed to create the output PDF.")
 
+    print("\n--- Run Report ---")
+    for line in report.format_lines():
+        print(line)
+
+    if args.extract_only:
+        return
+
     print("\n--- End of SKU Stamping Process ---")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-            file_name = sys.argv[1]
-            main(file_name)
-    else:
-        main()
+    main()
@@ -0,0 +1,57 @@
+import time
+
+# Phases of a run, in order; 'saving' covers the summary pages and the save
+PHASE_EXTRACTING = "extracting"
+PHASE_STAMPING = "stamping"
+PHASE_SAVING = "saving"
+
+# Seconds between two progress reports of the same phase
+DEFAULT_PROGRESS_INTERVAL = 1.0
+
+class ProgressReporter:
+    """
+    Passes page progress of an extraction or stamping run to a callback, called as
+    callback(phase, pages_done, total_pages).
+
+    Calls are throttled to one per interval, except that the start of every phase
+    and its last page are always reported. A callback that raises is reported
+    once and then ignored, so a broken progress display cannot stop the run.
+    Without a callback, reporting does nothing.
+    """
+
+    def __init__(self, callback=None, interval=DEFAULT_PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.phase = None
+        self.pages_done = 0
+        self.total_pages = 0
+        self.last_report = None
+
+    def start(self, phase, total_pages, pages_done=0):
+        """
+        Starts a phase and reports it at once.
+        """
+        self.phase = phase
+        self.total_pages = total_pages
+        self.pages_done = pages_done
+        self.report()
+
+    def advance(self, pages_done):
+        """
+        Records that the first pages_done pages of the current phase are done, and
+        reports it if the interval has passed or the phase is complete.
+        """
+        self.pages_done = pages_done
+        if (self.callback is not None and
+                (pages_done >= self.total_pages or time.monotonic() - self.last_report >= self.interval)):
+            self.report()
+
+    def report(self):
+        if self.callback is None:
+            return
+        self.last_report = time.monotonic()
+        try:
+            self.callback(self.phase, self.pages_done, self.total_pages)
+        except Exception as e:
+            print(f"Warning: Progress callback failed, no further progress is reported: {e}")
+            self.callback = None
@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# The report that safe_pdf_operation() and friends record into, per thread
+_active = threading.local()
+
+class StageTimer:
+    """
+    Measures one run of a stage; see RunReport.timer().
+    """
+    __slots__ = ('report', 'name', 'wall_start', 'cpu_start')
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+    def stop(self):
+        self.report.add_time(self.name, time.perf_counter() - self.wall_start, time.thread_time() - self.cpu_start)
+
+class RunReport:
+    """
+    Per-stage wall/CPU times and counters (pages, words, SKUs, retries, ...) of one
+    extraction or stamping run.
+
+    CPU time is the CPU time of the thread doing the work, so concurrent jobs in the
+    web app do not count each other's work. Reports from extraction worker processes
+    are merged in with merge(); their stage times are then summed over the workers
+    and can exceed the elapsed time.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    def timer(self, name):
+        """
+        Starts timing a stage that spans more code than fits a with block; call
+        stop() on the returned timer at its end.
+        """
+        return StageTimer(self, name)
+
+    @contextmanager
+    def stage(self, name):
+        timer = StageTimer(self, name)
+        try:
+            yield
+        finally:
+            timer.stop()
+
+    def add_time(self, name, wall_seconds, cpu_seconds, calls=1):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0}
+        stage['wall_seconds'] += wall_seconds
+        stage['cpu_seconds'] += cpu_seconds
+        stage['calls'] += calls
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, report_dict):
+        """
+        Adds the stages and counters of another report, as returned by its as_dict().
+        """
+        for name, stage in report_dict['stages'].items():
+            self.add_time(name, stage['wall_seconds'], stage['cpu_seconds'], stage['calls'])
+        for name, amount in report_dict['counters'].items():
+            self.count(name, amount)
+
+    def as_dict(self):
+        """
+        Returns the report as plain data (JSON serializable, picklable).
+        """
+        return {
+            'stages': {name: dict(stage) for name, stage in self.stages.items()},
+            'counters': dict(self.counters)
+        }
+
+    def format_lines(self):
+        lines = []
+        for name, stage in self.stages.items():
+            lines.append(f"  {name:<20} {stage['wall_seconds']:8.3f}s wall {stage['cpu_seconds']:8.3f}s CPU "
+                         f"({stage['calls']} call(s))")
+        if self.counters:
+            lines.append("  " + ", ".join(f"{name}={amount}" for name, amount in sorted(self.counters.items())))
+        return lines
+
+class _DisabledReport(RunReport):
+    """
+    Stand-in used when no report is active, so instrumented code needs no checks.
+    """
+
+    def add_time(self, name, wall_seconds, cpu_seconds, calls=1):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+DISABLED_REPORT = _DisabledReport()
+
+def current_report():
+    """
+    Returns the report active in this thread, or a report that records nothing.
+    """
+    return getattr(_active, 'report', None) or DISABLED_REPORT
+
+@contextmanager
+def activate(report):
+    """
+    Makes report the current report of this thread for the duration of the with block.
+    Passing None keeps the current report.
+    """
+    if report is None:
+        yield current_report()
+        return
+    previous = getattr(_active, 'report', None)
+    _active.report = report
+    try:
+        yield report
+    finally:
+        _active.report = previous
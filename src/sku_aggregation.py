@@ -0,0 +1,86 @@
+from collections import Counter, namedtuple
+
+# One order: a waybill page plus, for two-page orders, its continuation page.
+# 'pages' is a tuple of page numbers and 'skus' a tuple of (sku, quantity) pairs
+# sorted by SKU.
+OrderTotals = namedtuple('OrderTotals', ['order_id', 'pages', 'skus'])
+
+class SkuAggregation:
+    """
+    SKU statistics of one document, computed by aggregate_skus() and drawn by the
+    stamping and summary code (or exported as-is).
+
+    Attributes:
+        page_totals (dict): Page number -> Counter of SKU -> quantity, for pages with SKUs.
+        global_totals (Counter): SKU -> quantity over the whole document.
+        orders (list): OrderTotals of every order with SKUs, in page order.
+        mixed_order_patterns (Counter): The 'skus' tuple of every order with more than
+                                        one distinct SKU -> number of such orders.
+        mixed_order_sku_totals (Counter): SKU -> quantity over all mixed orders.
+    """
+    __slots__ = ('page_totals', 'global_totals', 'orders', 'mixed_order_patterns', 'mixed_order_sku_totals')
+
+    def __init__(self, page_totals, global_totals, orders, mixed_order_patterns, mixed_order_sku_totals):
+        self.page_totals = page_totals
+        self.global_totals = global_totals
+        self.orders = orders
+        self.mixed_order_patterns = mixed_order_patterns
+        self.mixed_order_sku_totals = mixed_order_sku_totals
+
+def aggregate_skus(sku_locations, continuation_pages=()):
+    """
+    Aggregates SKU records per page, per order and over the whole document.
+
+    Args:
+        sku_locations (list): SkuRecord objects (or dicts with 'sku', 'quantity',
+                              'page_num' and 'order_id').
+        continuation_pages (set): Pages that continue the order of the previous page,
+                                  see ExtractionResult.pages.
+
+    Returns:
+        SkuAggregation: The aggregated statistics.
+    """
+    page_totals = {}
+    page_order_ids = {}
+    global_totals = Counter()
+    for sku_info in sku_locations:
+        page_num = sku_info['page_num']
+        totals = page_totals.get(page_num)
+        if totals is None:
+            totals = page_totals[page_num] = Counter()
+            page_order_ids[page_num] = sku_info['order_id']
+        totals[sku_info['sku']] += sku_info['quantity']
+        global_totals[sku_info['sku']] += sku_info['quantity']
+
+    orders = []
+    mixed_order_patterns = Counter()
+    mixed_order_sku_totals = Counter()
+    for page_num in sorted(page_totals):
+        # Counted with the previous page
+        if page_num in continuation_pages and page_num - 1 in page_totals:
+            continue
+
+        order_totals = page_totals[page_num]
+        order_pages = (page_num,)
+        if page_num + 1 in continuation_pages and page_num + 1 in page_totals:
+            order_totals = order_totals.copy()
+            order_totals.update(page_totals[page_num + 1])
+            order_pages = (page_num, page_num + 1)
+
+        skus = tuple(sorted(order_totals.items()))
+        orders.append(OrderTotals(page_order_ids[page_num], order_pages, skus))
+        if len(skus) > 1:
+            mixed_order_patterns[skus] += 1
+            for sku, quantity in skus:
+                mixed_order_sku_totals[sku] += quantity
+
+    return SkuAggregation(page_totals, global_totals, orders, mixed_order_patterns, mixed_order_sku_totals)
+
+def format_sku_quantity(sku, quantity):
+    return f"{sku} (x{quantity})"
+
+def format_pattern(pattern):
+    """
+    Returns the display text of a mixed order pattern, e.g. "BWL (x1) / BWM (x2)".
+    """
+    return " / ".join(format_sku_quantity(sku, quantity) for sku, quantity in pattern)
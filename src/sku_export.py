@@ -0,0 +1,85 @@
+import csv
+import json
+from sku_aggregation import format_pattern
+
+EXPORT_FORMATS = ("json", "csv")
+
+CSV_COLUMNS = ['section', 'order_id', 'pages', 'sku', 'quantity', 'pattern', 'order_count']
+
+def sku_list(sku_quantities):
+    return [{'sku': sku, 'quantity': quantity} for sku, quantity in sku_quantities]
+
+def aggregation_as_dict(aggregation):
+    """
+    Returns the statistics of a SkuAggregation as plain data (JSON serializable).
+    Page numbers are 1-based, as printed on the console and shown in PDF viewers.
+
+    Returns:
+        dict: With 'orders' (per-order SKU lines, in page order), 'sku_totals',
+              'mixed_order_patterns' and 'mixed_order_sku_totals'.
+    """
+    return {
+        'orders': [
+            {
+                'order_id': order.order_id,
+                'pages': [page_num + 1 for page_num in order.pages],
+                'skus': sku_list(order.skus)
+            }
+            for order in aggregation.orders
+        ],
+        'sku_totals': sku_list(sorted(aggregation.global_totals.items())),
+        'mixed_order_patterns': [
+            {
+                'pattern': pattern_text,
+                'order_count': count,
+                'skus': sku_list(pattern)
+            }
+            for pattern_text, count, pattern in sorted(
+                (format_pattern(pattern), count, pattern) for pattern, count in aggregation.mixed_order_patterns.items())
+        ],
+        'mixed_order_sku_totals': sku_list(sorted(aggregation.mixed_order_sku_totals.items()))
+    }
+
+def csv_rows(export):
+    """
+    Flattens aggregation_as_dict() output into CSV rows, one row per SKU line.
+    The 'section' column tells the tables apart: 'order', 'sku_total',
+    'mixed_pattern' (quantity per order of that pattern) and 'mixed_sku_total'.
+    """
+    for order in export['orders']:
+        pages = ";".join(str(page_num) for page_num in order['pages'])
+        for line in order['skus']:
+            yield {'section': 'order', 'order_id': order['order_id'], 'pages': pages, **line}
+    for line in export['sku_totals']:
+        yield {'section': 'sku_total', **line}
+    for pattern in export['mixed_order_patterns']:
+        for line in pattern['skus']:
+            yield {'section': 'mixed_pattern', 'pattern': pattern['pattern'], 'order_count': pattern['order_count'],
+                   **line}
+    for line in export['mixed_order_sku_totals']:
+        yield {'section': 'mixed_sku_total', **line}
+
+def write_export(aggregation, output_path, export_format, source=None):
+    """
+    Writes the SKU statistics of a document as JSON or CSV, without rendering a PDF.
+
+    Args:
+        aggregation (SkuAggregation): The statistics, see aggregate_skus().
+        output_path (str): File to write.
+        export_format (str): "json" or "csv".
+        source (str): Optional name of the source PDF, included in JSON exports.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of {EXPORT_FORMATS}")
+
+    export = aggregation_as_dict(aggregation)
+    if export_format == "json":
+        if source is not None:
+            export = {'source': source, **export}
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(export, f, indent=2)
+    else:
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            writer.writerows(csv_rows(export))
@@ -0,0 +1,66 @@
+import sys
+import fitz # PyMuPDF
+
+class SkuRecord:
+    """
+    Compact record for one extracted SKU.
+
+    Large waybill batches produce tens of thousands of these, so the record uses
+    __slots__, keeps its bounding box as four floats rather than a fitz.Rect, and
+    interns the SKU and Order ID strings, which repeat across many records.
+
+    Records support the dictionary-style access existing callers use, e.g.
+    record['sku'], record['bbox'] (a new fitz.Rect), record.get('order_id') and
+    record['order_id'] = new_order_id.
+    """
+    __slots__ = ('sku', 'quantity', 'page_num', 'order_id', 'x0', 'y0', 'x1', 'y1')
+
+    FIELDS = ('sku', 'quantity', 'page_num', 'bbox', 'order_id')
+
+    def __init__(self, sku, quantity, page_num, bbox, order_id):
+        self.sku = sys.intern(sku)
+        self.quantity = quantity
+        self.page_num = page_num
+        self.order_id = sys.intern(order_id)
+        self.x0, self.y0, self.x1, self.y1 = bbox
+
+    @property
+    def bbox(self):
+        return fitz.Rect(self.x0, self.y0, self.x1, self.y1)
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key == 'bbox':
+            self.x0, self.y0, self.x1, self.y1 = value
+        elif key in ('sku', 'order_id'):
+            setattr(self, key, sys.intern(value))
+        elif key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.FIELDS]
+
+    def __eq__(self, other):
+        if not isinstance(other, SkuRecord):
+            return NotImplemented
+        return (self.sku, self.quantity, self.page_num, self.order_id, self.x0, self.y0, self.x1, self.y1) == \
+               (other.sku, other.quantity, other.page_num, other.order_id, other.x0, other.y0, other.x1, other.y1)
+
+    def __repr__(self):
+        return (f"SkuRecord(sku={self.sku!r}, quantity={self.quantity}, page_num={self.page_num}, "
+                f"order_id={self.order_id!r}, bbox=({self.x0}, {self.y0}, {self.x1}, {self.y1}))")
@@ -0,0 +1,278 @@
+import fitz # PyMuPDF
+from collections import namedtuple
+
+# One wrapped summary entry: its text rows, in order, and the font size they are drawn at
+WrappedEntry = namedtuple('WrappedEntry', ['font_size', 'rows'])
+
+class SummaryLayout:
+    """
+    Lays out the summary sections appended after the waybill pages ("All SKUs",
+    "Mix Orders Patterns", "Mix Orders SKU Count", ...).
+
+    Every entry is wrapped once, in a single pass over the cumulative widths of its
+    text, and pages are filled using the exact height of each wrapped entry, so the
+    pages that are created are exactly the pages that get drawn.
+
+    SKUs are never broken between characters while there is another way to fit
+    them: an entry whose widest SKU is wider than a row gets a smaller font, and a
+    section whose columns are too narrow for an SKU even at min_font_size is laid
+    out in a single column.
+
+    A section is a dict made with summary_section(). Pages returned by paginate()
+    are dicts with 'title', 'title_font_size', 'columns' (lists of WrappedEntry),
+    'column_count' and 'bullets', and are drawn with render().
+    """
+
+    def __init__(self, measurer, page_width, page_height, font_size=12, min_font_size=8,
+                 margin=20, padding=10, column_gap=20):
+        self.measurer = measurer
+        self.page_width = page_width
+        self.page_height = page_height
+        self.font_size = font_size
+        self.min_font_size = min_font_size
+        self.margin = margin
+        self.padding = padding
+        self.column_gap = column_gap
+
+        self.line_height = font_size * 1.4
+        self.bullet_radius = 3
+        self.bullet_space = 15  # Bullet circle plus the gap before the entry text
+        self.text_area_width = page_width - (2 * margin) - (2 * padding)
+
+    def column_width(self, column_count):
+        return (self.text_area_width - self.column_gap * (column_count - 1)) / column_count
+
+    def entry_width(self, column_count, bullets):
+        return self.column_width(column_count) - (self.bullet_space if bullets else 0)
+
+    @staticmethod
+    def pieces(text):
+        """
+        Returns the (start, end) character ranges of the pieces a row may break
+        between: the ' / '-separated SKUs of pattern entries, the words of others.
+        """
+        separator = " / " if " / " in text else " "
+        pieces = []
+        start = 0
+        while True:
+            end = text.find(separator, start)
+            if end == -1:
+                pieces.append((start, len(text)))
+                return pieces
+            pieces.append((start, end))
+            start = end + len(separator)
+
+    def widest_piece(self, text):
+        """
+        Returns the width at font size 1 of the widest piece of text, see pieces().
+        """
+        widths = self.measurer.prefix_widths(text)
+        return max(widths[end] - widths[start] for start, end in self.pieces(text))
+
+    def wrap_entry(self, text, max_width):
+        """
+        Breaks text into rows no wider than max_width. Pattern entries break between
+        their ' / '-separated SKUs, other entries between words. If a single piece is
+        wider than a row on its own, the entry's font shrinks (down to min_font_size)
+        until it fits; only a piece still too wide then is broken between characters.
+
+        Returns:
+            WrappedEntry: The font size and the rows, in order.
+        """
+        widths = self.measurer.prefix_widths(text)
+        font_size = self.font_size
+        if widths[-1] * font_size <= max_width:
+            return WrappedEntry(font_size, [text])
+
+        pieces = self.pieces(text)
+        widest_piece = max(widths[end] - widths[start] for start, end in pieces)
+        while widest_piece * font_size > max_width and font_size > self.min_font_size:
+            font_size -= 0.5
+        if widths[-1] * font_size <= max_width:
+            return WrappedEntry(font_size, [text])
+
+        rows = []
+        row_start = row_end = None
+        for piece_start, piece_end in pieces:
+            if row_start is not None and (widths[piece_end] - widths[row_start]) * font_size <= max_width:
+                row_end = piece_end
+                continue
+            if row_start is not None:
+                rows.append(text[row_start:row_end])
+            row_start, row_end = piece_start, piece_end
+
+            # Piece too wide for a row of its own
+            while (widths[row_end] - widths[row_start]) * font_size > max_width:
+                fitting = self.measurer.fitting_prefix_length(text[row_start:row_end], max_width, font_size)
+                fitting = max(fitting, 1)
+                rows.append(text[row_start:row_start + fitting])
+                row_start += fitting
+        if row_start is not None and row_start < row_end:
+            rows.append(text[row_start:row_end])
+        return WrappedEntry(font_size, rows)
+
+    def fit_title(self, title):
+        """
+        Returns the font size at which title fits the text area.
+        """
+        title_font_size, _ = self.measurer.fit_font_size(title, self.text_area_width, self.font_size, self.min_font_size)
+        return title_font_size
+
+    def rows_per_column(self, title_font_size):
+        available_height = (self.page_height - (2 * self.margin) - (2 * self.padding) - title_font_size * 1.8)
+        return max(1, int(available_height // self.line_height))
+
+    def paginate(self, sections):
+        """
+        Wraps the entries of all sections and distributes them over pages.
+
+        Returns:
+            list: Page layouts, in order, for render().
+        """
+        pages = []
+        for section in sections:
+            column_count = section['columns']
+            bullets = section['bullets']
+            # Columns too narrow for an SKU even at the smallest font: one column instead
+            if column_count > 1 and any(self.widest_piece(text) * self.min_font_size >
+                                        self.entry_width(column_count, bullets) for text in section['entries']):
+                column_count = 1
+            max_width = self.entry_width(column_count, bullets)
+            entries = [self.wrap_entry(text, max_width) for text in section['entries']]
+
+            title = section['title']
+            next_entry = 0
+            while next_entry < len(entries):
+                title_font_size = self.fit_title(title)
+                rows_per_column = self.rows_per_column(title_font_size)
+
+                # Fill the columns top to bottom with whole entries; an entry taller than
+                # a column is split
+                columns = []
+                while len(columns) < column_count and next_entry < len(entries):
+                    column = []
+                    column_rows = 0
+                    while next_entry < len(entries) and column_rows + len(entries[next_entry].rows) <= rows_per_column:
+                        column_rows += len(entries[next_entry].rows)
+                        column.append(entries[next_entry])
+                        next_entry += 1
+                    if not column:
+                        entry = entries[next_entry]
+                        column.append(WrappedEntry(entry.font_size, entry.rows[:rows_per_column]))
+                        entries[next_entry] = WrappedEntry(entry.font_size, entry.rows[rows_per_column:])
+                    columns.append(column)
+
+                # The last page of a section spreads its rows evenly over the columns
+                if next_entry == len(entries) and column_count > 1:
+                    columns = self.balance_columns(columns, column_count, rows_per_column) or columns
+
+                pages.append({
+                    'title': title,
+                    'title_font_size': title_font_size,
+                    'columns': columns,
+                    'column_count': column_count,
+                    'bullets': bullets
+                })
+                title = section['continued_title']
+        return pages
+
+    def balance_columns(self, columns, column_count, rows_per_column):
+        """
+        Redistributes the entries of filled columns so that every column but the
+        last holds about the same number of rows.
+
+        Returns:
+            list: The new columns, or None if the entries do not fit that way.
+        """
+        entries = [entry for column in columns for entry in column]
+        total_rows = sum(len(entry.rows) for entry in entries)
+        target_rows = -(-total_rows // column_count)  # ceiling division
+
+        balanced = [[]]
+        column_rows = 0
+        for entry in entries:
+            if balanced[-1] and column_rows >= target_rows:
+                balanced.append([])
+                column_rows = 0
+            balanced[-1].append(entry)
+            column_rows += len(entry.rows)
+
+        if len(balanced) > column_count or any(sum(len(entry.rows) for entry in column) > rows_per_column
+                                               for column in balanced):
+            return None
+        return balanced
+
+    def render(self, page, page_layout):
+        """
+        Draws one page layout from paginate() onto a PDF page. The background and
+        bullets are collected in one Shape and all text in one TextWriter, so the
+        page gets two content writes however many rows it has.
+        """
+        font_size = self.font_size
+        title_font_size = page_layout['title_font_size']
+        column_count = page_layout['column_count']
+        bullets = page_layout['bullets']
+        text_offset = (2 * self.bullet_radius) + 8 if bullets else 0  # Entry text starts after the bullet
+
+        column_rows = [sum(len(entry.rows) for entry in column) for column in page_layout['columns']]
+        content_height = title_font_size * 1.8 + max(column_rows) * self.line_height
+
+        if column_count > 1:
+            content_width = self.text_area_width
+        else:
+            # Single column backgrounds shrink to the widest row (or the title)
+            content_width = self.measurer.text_length(page_layout['title'], title_font_size)
+            for entry in page_layout['columns'][0]:
+                for row in entry.rows:
+                    content_width = max(content_width, self.measurer.text_length(row, entry.font_size) + text_offset)
+
+        top = self.margin
+        background_rect = fitz.Rect(self.margin, top, self.margin + content_width + (2 * self.padding),
+                                    top + content_height + (2 * self.padding))
+        shape = page.new_shape()
+        shape.draw_rect(background_rect)
+        shape.finish(color=(0.9, 0.9, 0.9), fill=(0.9, 0.9, 0.9))
+
+        font = self.measurer.font
+        text_writer = fitz.TextWriter(page.rect)
+        text_x = self.margin + self.padding
+        title_y = top + self.padding + title_font_size
+        text_writer.append(fitz.Point(text_x, title_y), page_layout['title'], font=font, fontsize=title_font_size)
+        first_row_y = title_y + title_font_size * 0.8 + font_size
+
+        column_width = self.column_width(column_count)
+        for column_index, column in enumerate(page_layout['columns']):
+            column_x = text_x + column_index * (column_width + self.column_gap)
+            row_y = first_row_y
+            for entry in column:
+                if bullets:
+                    bullet_center = fitz.Point(column_x + self.bullet_radius + 2, row_y - (entry.font_size * 0.3))
+                    shape.draw_circle(bullet_center, self.bullet_radius)
+                for row in entry.rows:
+                    text_writer.append(fitz.Point(column_x + text_offset, row_y), row, font=font,
+                                       fontsize=entry.font_size)
+                    row_y += self.line_height
+        if bullets:
+            shape.finish(color=(0, 0, 0), fill=(0, 0, 0))
+
+        shape.commit()
+        text_writer.write_text(page, color=(0, 0, 0))
+
+def summary_section(title, entries, columns=1, continued_title=None, bullets=True):
+    """
+    Describes one summary section for SummaryLayout.paginate().
+
+    Args:
+        title (str): Title of the section's first page.
+        entries (list): Entry texts, in display order (without bullets).
+        columns (int): Number of columns per page.
+        continued_title (str): Title of the following pages (default: title).
+        bullets (bool): Whether each entry gets a bullet.
+    """
+    return {
+        'title': title,
+        'continued_title': continued_title or title,
+        'entries': list(entries),
+        'columns': columns,
+        'bullets': bullets
+    }
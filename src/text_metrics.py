@@ -0,0 +1,115 @@
+import fitz # PyMuPDF
+
+class TextMeasurer:
+    """
+    Measures text set in one of PyMuPDF's built-in fonts, and holds the fitz.Font
+    that stamps and summary pages are written with (see fitz.TextWriter).
+
+    Widths come from a table of per-character advances at font size 1, filled from
+    the font the first time a character is seen, so measuring a string is a sum of
+    table lookups instead of a font call. Widths of whole strings and the
+    cumulative widths of their prefixes are cached, because layout code measures the
+    same lines (and their growing prefixes while wrapping) many times.
+    """
+    MAX_CACHED_STRINGS = 20000
+
+    def __init__(self, fontname="helv"):
+        self.fontname = fontname
+        self.font = fitz.Font(fontname)
+        self.advances = {}
+        self.unit_widths = {}
+        self.prefix_tables = {}
+
+    def advance(self, char):
+        """
+        Returns the advance width of a single character at font size 1.
+        """
+        width = self.advances.get(char)
+        if width is None:
+            width = self.advances[char] = self.font.text_length(char, fontsize=1)
+        return width
+
+    def line_spacing(self, fontsize):
+        """
+        Returns the distance between the baselines of consecutive lines, as used by
+        page.insert_text() for multi-line text.
+        """
+        return (self.font.ascender - self.font.descender) * fontsize
+
+    def unit_width(self, text):
+        """
+        Returns the width of text at font size 1.
+        """
+        width = self.unit_widths.get(text)
+        if width is None:
+            advances = self.advances
+            width = 0
+            for char in text:
+                advance = advances.get(char)
+                width += advance if advance is not None else self.advance(char)
+            if len(self.unit_widths) >= self.MAX_CACHED_STRINGS:
+                self.unit_widths.clear()
+            self.unit_widths[text] = width
+        return width
+
+    def text_length(self, text, fontsize):
+        """
+        Returns the width of text at the given font size, like Font.text_length().
+        """
+        return self.unit_width(text) * fontsize
+
+    def prefix_widths(self, text):
+        """
+        Returns the cumulative widths of text at font size 1: element i is the width
+        of text[:i], so the list has len(text) + 1 elements.
+        """
+        widths = self.prefix_tables.get(text)
+        if widths is None:
+            widths = [0]
+            width = 0
+            for char in text:
+                width += self.advance(char)
+                widths.append(width)
+            if len(self.prefix_tables) >= self.MAX_CACHED_STRINGS:
+                self.prefix_tables.clear()
+            self.prefix_tables[text] = widths
+        return widths
+
+    def fitting_prefix_length(self, text, max_width, fontsize):
+        """
+        Returns the length of the longest prefix of text that is at most max_width
+        wide at the given font size (binary search over the cached prefix widths).
+        """
+        widths = self.prefix_widths(text)
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if widths[middle] * fontsize <= max_width:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def fit_font_size(self, text, max_width, fontsize, min_fontsize, step=0.5):
+        """
+        Shrinks fontsize in steps until text fits max_width or min_fontsize is reached.
+
+        Returns:
+            tuple: (font size, width of text at that size)
+        """
+        unit_width = self.unit_width(text)
+        while unit_width * fontsize > max_width and fontsize > min_fontsize:
+            fontsize -= step
+        return fontsize, unit_width * fontsize
+
+# One measurer per font, shared by all layout code in the process
+_measurers = {}
+
+def get_text_measurer(fontname="helv"):
+    """
+    Returns the shared TextMeasurer for a built-in font.
+    """
+    measurer = _measurers.get(fontname)
+    if measurer is None:
+        measurer = _measurers[fontname] = TextMeasurer(fontname)
+    return measurer